@@ -0,0 +1,210 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import sys, random, threading, time, argparse
+import Game, Graphs, RPSNetwork, RPSEventServer
+
+
+class Strategy:
+    """
+    This class represents the decisions of a player without user, see Game.Player.strategy. This
+    strategy chooses randomly and plays the given number of games. Other strategies override
+    choose or play_again. Both methods get the player object, whose events contain the course of
+    the games so far, see Game.notify.
+    """
+    def __init__(self, games=1, rng=random):
+        """
+        Creates a new Strategy object.
+        :param games: The number of games, after that no regame is requested.
+        :param rng: The random number generator, the random module or a random.Random object.
+        """
+        self.games = games
+        self.rng = rng
+
+    def choose(self, player):
+        """
+        Chooses the graph of the next turn.
+        :param player: The Game.Player object.
+        :return: The graph index, 0 for rock, 1 for paper or 2 for scissor.
+        """
+        return self.rng.randint(0, Game.GRAPH_NUMBERS - 1)
+
+    def play_again(self, player):
+        """
+        Decides, whether the player wants to play again after a game.
+        :param player: The Game.Player object.
+        :return: True to play again.
+        """
+        return games_played(player.events) < self.games
+
+
+class FixedStrategy(Strategy):
+    """
+    This class represents a strategy, that repeats the given choices turn by turn.
+    """
+    def __init__(self, choices, games=1):
+        """
+        Creates a new FixedStrategy object.
+        :param choices: A list of graph indices.
+        :param games: The number of games, see Strategy.
+        """
+        Strategy.__init__(self, games)
+        self.choices = choices
+
+    def choose(self, player):
+        turns = [e for e in player.events if e[0] == Game.EVENT_TURN]
+        return self.choices[len(turns) % len(self.choices)]
+
+
+class CounterStrategy(Strategy):
+    """
+    This class represents a strategy, that chooses the graph, that beats the last choice of the opponent.
+    The first choice is random.
+    """
+    def choose(self, player):
+        turns = [e[1] for e in player.events if e[0] == Game.EVENT_TURN]
+        if len(turns) == 0:
+            return Strategy.choose(self, player)
+
+        # Rock beats scissor, paper beats rock and scissor beats paper.
+        return (turns[-1][1] + 1) % Game.GRAPH_NUMBERS
+
+
+def games_played(events):
+    """
+    Counts the finished games in the given events.
+    :param events: A list of event tuples, see Game.notify.
+    :return: The number of turns, that were not a draw.
+    """
+    return len([e for e in events if e[0] == Game.EVENT_TURN and e[1][2] != Game.RES_DRAW])
+
+
+def new_player(name, strategy):
+    """
+    Creates a player without user.
+    :param name: The player name.
+    :param strategy: The Strategy object.
+    :return: The Game.Player object.
+    """
+    player = Game.Player()
+    player.name = name
+    player.strategy = strategy
+    player.client = RPSNetwork.RPSClient()
+    return player
+
+
+def run(player, srv_addr):
+    """
+    Plays with the given player like Launcher.launch, until the strategy declines a regame or no regame
+    is possible. Nothing is printed, errors raise a ValueError or a socket.error.
+    :param player: A player object with a strategy, see new_player.
+    :param srv_addr: Server address, port tuple.
+    :return: The events of the player, see Game.notify.
+    """
+    try:
+        Game.connect(player, srv_addr)
+        if Game.share_graphs(player):
+            play_game(player)
+            while Game.play_again(player):
+                play_game(player)
+    finally:
+        player.close()
+
+    return player.events
+
+
+def play_game(player):
+    """
+    Plays the turns of one game.
+    :param player: The player object.
+    """
+    while not Game.play(player):
+        pass
+
+
+def load_test(srv_addr, bots, games):
+    """
+    Runs the given number of bots in threads. The bots are paired by the server and play the given
+    number of games with each other.
+    :param srv_addr: Server address, port tuple.
+    :param bots: The number of bots, an even number.
+    :param games: The number of games of each bot.
+    :return: A tuple with the number of finished games, the time in seconds and the number of failed bots.
+    """
+    events = [None] * bots
+
+    def run_bot(i):
+        try:
+            events[i] = run(new_player('bot' + str(i), Strategy(games)), srv_addr)
+        except Exception, e:
+            print 'Bot ' + str(i) + ' has failed: ' + str(e)
+
+    threads = [threading.Thread(target=run_bot, args=(i,)) for i in range(0, bots)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    # Each game is counted by both players.
+    finished = sum(games_played(e) for e in events if e is not None) / 2
+    return finished, elapsed, events.count(None)
+
+
+def main(argv):
+    """
+    Command line tool to play many games with bots, e.g. to load test a server.
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Plays RPS games with bots.')
+    parser.add_argument('--host', default='localhost', help='the host of the server')
+    parser.add_argument('--port', type=int, default=54321, help='the tcp port of the server')
+    parser.add_argument('--bots', type=int, default=2, help='the number of bots, an even number')
+    parser.add_argument('--games', type=int, default=10, help='the number of games of each bot')
+    parser.add_argument('--vertices', type=int, default=Game.GRAPH_VERTICES, help='the vertices of each graph')
+    parser.add_argument('--server', choices=['thread', 'event'],
+                        help='starts a server with the given engine on the port, instead of using a running server')
+    args = parser.parse_args(argv)
+
+    if args.bots <= 0 or args.bots % 2 != 0:
+        parser.error('the number of bots must be even')
+
+    Game.GRAPH_VERTICES = args.vertices
+    Game.GRAPH_ENGINE = Graphs.ENGINE_PAIRING
+
+    server = None
+    if args.server is not None:
+        if args.server == 'event':
+            server = RPSEventServer.RPSEventServer()
+        else:
+            server = RPSNetwork.RPSServer()
+        server.start_background(args.port, args.port)
+        if not server.wait_ready(Game.SERVER_START_TIMEOUT) or not server.running:
+            print 'Unable to start server'
+            sys.exit(1)
+
+    try:
+        finished, elapsed, failed = load_test((args.host, args.port), args.bots, args.games)
+    finally:
+        if server is not None:
+            server.stop()
+
+    print '%d games in %.2f s, %.1f games/s, %d failed bots' % (finished, elapsed, finished / elapsed, failed)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -14,8 +14,7 @@ THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRI
 THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
 TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
-import sys, RPSNetwork, Graphs, pickle, time
-from thread import *
+import sys, os, random, hashlib, collections, RPSNetwork, Graphs, GraphPool, GraphLibrary, GraphInvariants, GraphWorkers, GraphCodec
 
 #
 # User input to start the game.
@@ -27,6 +26,47 @@ USR_START = 's'
 #
 GRAPH_NUMBERS = 3
 
+#
+# The number of vertices of each graph.
+#
+GRAPH_VERTICES = 100
+
+#
+# The degree of each vertex in a graph.
+#
+GRAPH_DEGREE = 2
+
+#
+# The generator for random graphs, see Graphs.random_graph.
+#
+GRAPH_ENGINE = Graphs.ENGINE_MATRIX
+
+#
+# The number of processes that generate graphs in parallel. 0 generates the graphs in this process.
+#
+GRAPH_PROCESSES = 0
+
+#
+# The number of extra graphs, that the processes generate speculatively. The graphs that finish first are used.
+#
+GRAPH_SPECULATIVE = 0
+
+#
+# The graph library file with pre-generated graphs, see GraphLibrary. The graphs are generated live
+# if the file does not exist or all triples are used.
+#
+GRAPH_LIBRARY = 'graphs.rpsl'
+
+#
+# The number of isomorphic copies per graph, that are prepared in the background. 0 disables the pool.
+#
+COPY_POOL_SIZE = GraphPool.DEFAULT_SIZE
+
+#
+# The pool refills the copies of a graph, if there are less than this number.
+#
+COPY_POOL_LOW_WATERMARK = GraphPool.DEFAULT_LOW_WATERMARK
+
 #
 # Flag for the input_handler function. Indicates that the input should be string.
 #
@@ -42,6 +82,66 @@ REQ_INTEGER = 1
 #
 REQ_PORT = 2
 
+#
+# Certifies that the graphs of a game are not isomorphic. The counters show which invariants decided.
+#
+CERTIFIER = GraphInvariants.Certifier()
+
+#
+# The maximal time in seconds to wait for the own server to listen.
+#
+SERVER_START_TIMEOUT = 10
+
+#
+# Whether player 1 offers the last triple again instead of fresh graphs, if the server supports it,
+# see RPSNetwork.FEATURE_GRAPH_CACHE.
+#
+GRAPH_REUSE = True
+
+#
+# Whether generated graphs are shared as seed, if the opponent supports it, see RPSNetwork.FEATURE_SEED.
+# The graphs of the library are always sent as edge lists.
+#
+GRAPH_SEEDS = True
+
+#
+# Whether the first player commits to the digest of its isomorphic graph instead of sending the graph,
+# if the opponent supports it, see RPSNetwork.FEATURE_COMMIT.
+#
+COMMIT_TURNS = False
+
+#
+# The number of random bytes of the nonce of a commitment.
+#
+COMMIT_NONCE_SIZE = 16
+
+#
+# The maximal number of triples, that a player keeps to reuse them in later games.
+#
+TRIPLE_CACHE_SIZE = 16
+
+#
+# The file, that caches the discovered servers, or None to broadcast each time.
+#
+DISCOVERY_CACHE = os.path.expanduser('~/.rps_servers')
+
+#
+# The names of the choices in the order of the graphs.
+#
+CHOICES = ['Rock', 'Paper', 'Scissor']
+
+#
+# Events, that a player with a strategy records instead of printing them, see notify.
+# (EVENT_OPPONENT, name) when an opponent is found.
+# (EVENT_GRAPHS, how) when the graphs are shared, how is 'sent', 'received' or 'reused'.
+# (EVENT_TURN, (choice, opponents choice, result)) after each turn, result is one of the RES_ constants.
+# (EVENT_OPPONENT_LEFT, name) when the opponent does not play again.
+#
+EVENT_OPPONENT = 'opponent'
+EVENT_GRAPHS = 'graphs'
+EVENT_TURN = 'turn'
+EVENT_OPPONENT_LEFT = 'opponent_left'
+
 #
 # The game result for winning.
 #
@@ -63,13 +163,51 @@ class Player:
     This class represents a player. A player object stores the name, the RPSClient
     and a graph list.
     """
-    def __init__(self):
+    def __init__(self, graph_type=Graphs.Graph):
         """
         Creates a new player object.
+        :param graph_type: The class of the stored graphs, Graphs.Graph or Graphs.CompactGraph.
         """
         self.name = ''
         self.client = None
         self.graphs = []
+        self.graph_type = graph_type
+
+        # Maps the fingerprint of each graph in self.graphs to its index.
+        self.graph_index = {}
+
+        # Prepares isomorphic copies of self.graphs in the background, see start_copy_pool.
+        self.copy_pool = None
+
+        # A GraphLibrary.GraphLibrary object with pre-generated graphs or None.
+        self.library = None
+
+        # A GraphWorkers.GraphWorkers object to generate graphs in parallel or None.
+        self.workers = None
+
+        # The RPSNetwork.RPSServer, that this player has started, or None.
+        self.server = None
+
+        # Maps the hash of each known triple to its batch or seed message, see RPSNetwork.triple_hash.
+        self.triples = collections.OrderedDict()
+
+        # Maps the hash of each known triple to its graph objects, so a held triple is not generated again.
+        self.triple_graphs = {}
+
+        # The strategy of a player without user, see Bots.Strategy, or None for an interactive player.
+        self.strategy = None
+
+        # The events of a player with a strategy, see notify.
+        self.events = []
+        self.opponent = None
+
+    def new_graph(self, edges):
+        """
+        Creates a graph of the type self.graph_type from the given edge list.
+        :param edges: A list of tuples.
+        :return: The graph object.
+        """
+        return self.graph_type(edges)
 
     def look_for_server(self, port):
         """
@@ -83,8 +221,9 @@ class Player:
         """
         Connects the self.client to the given address.
         :param srv_addr: Address tuple of the server.
+        :return: Whether the connect was successfully or not.
         """
-        self.client.connect(srv_addr)
+        return self.client.connect(srv_addr)
 
     def send(self, msg):
         """
@@ -102,9 +241,10 @@ class Player:
 
     def add_graph(self, g):
         """
-        Appends the given graph to self.graphs.
+        Appends the given graph to self.graphs and registers its fingerprint.
         :param g: Reference to graph object.
         """
+        self.graph_index.setdefault(g.fingerprint(), len(self.graphs))
         self.graphs.append(g)
 
     def send_graph(self, i):
@@ -112,16 +252,46 @@ class Player:
         Sends the graph on the given index with self.client.
         :param i: The index of a graph in self.graphs.
         """
-        g = self.graphs[i]
-        self.send(pickle.dumps(g.edges))
+        self.send_edges(self.graphs[i])
+
+    def send_edges(self, g):
+        """
+        Sends the edges of the given graph encoded with GraphCodec. The encoded edges are sent in chunks,
+        while they are encoded.
+        :param g: The graph object.
+        """
+        self.client.send_chunks(GraphCodec.iter_encode_edges(g))
+
+    def receive_decoded(self):
+        """
+        Receives the next message. An edge list encoded with GraphCodec is decoded chunk by chunk,
+        while it arrives.
+        :return: A graph object for an encoded edge list, otherwise the message string or None.
+        """
+        decoder = None
+        parts = []
+        for chunk in self.client.receive_chunks():
+            if decoder is None and len(parts) == 0 and GraphCodec.payload_type(chunk) == GraphCodec.TYPE_EDGES:
+                decoder = GraphCodec.EdgeDecoder()
+
+            if decoder is not None:
+                decoder.feed(chunk)
+            else:
+                parts.append(chunk)
+
+        if decoder is not None:
+            return self.new_graph(decoder.finish())
+        if len(parts) == 0:
+            return None
+        return ''.join(parts)
 
     def load_graph(self, dmp):
         """
         Receives a graphs and appends it at self.graphs.
-        :param dmp: A pickle dump that contains the edge list of a graph.
+        :param dmp: An edge list encoded with GraphCodec.
         """
-        edges = pickle.loads(dmp)
-        self.graphs.append(Graphs.Graph(edges))
+        edges = GraphCodec.decode_edges(dmp)
+        self.add_graph(self.new_graph(edges))
 
     def get_graph(self, i):
         """
@@ -134,16 +304,134 @@ class Player:
         else:
             return None
 
+    def start_copy_pool(self, size=COPY_POOL_SIZE, low_watermark=COPY_POOL_LOW_WATERMARK):
+        """
+        Starts a GraphPool.CopyPool for the current graphs. A running pool is stopped before.
+        :param size: The number of copies per graph.
+        :param low_watermark: The pool refills a graph, if it has less copies.
+        """
+        self.stop_copy_pool()
+        self.copy_pool = GraphPool.CopyPool(self.graphs, size, low_watermark)
+        self.copy_pool.start()
+
+    def clear_graphs(self):
+        """
+        Removes the graphs of the last game.
+        """
+        self.stop_copy_pool()
+        self.graphs = []
+        self.graph_index = {}
+
+    def add_triple(self, msg):
+        """
+        Adds the graphs of a batch message or a seed message and remembers the triple for later games.
+        The graphs of a seed message are generated like generate_seeded_graphs. The graphs of a triple,
+        which is already held, are neither decoded nor generated and certified again.
+        :param msg: The batch message, see GraphCodec.encode_batch, or the seed message, see
+        GraphCodec.encode_seed.
+        :raise ValueError: If the message is not correct or the digest of the generated graphs does not match.
+        """
+        graphs = self.triple_graphs.get(RPSNetwork.triple_hash(msg))
+        if graphs is None:
+            graphs = self.triple_graphs_of(msg)
+
+        for g in graphs:
+            self.add_graph(g)
+        self.remember_triple(msg, graphs)
+
+    def triple_graphs_of(self, msg):
+        """
+        Decodes the graphs of a batch message or generates the graphs of a seed message. A seed message
+        is only accepted for GRAPH_NUMBERS graphs with GRAPH_VERTICES vertices and GRAPH_DEGREE, so the
+        opponent can not request arbitrary large graphs.
+        :param msg: The batch message or the seed message.
+        :return: The list of GRAPH_NUMBERS graph objects.
+        :raise ValueError: If the message is not correct or the digest of the generated graphs does not match.
+        """
+        if GraphCodec.payload_type(msg) == GraphCodec.TYPE_SEED:
+            version, engine, num_graphs, vertices, degree, seed, digest = GraphCodec.decode_seed(msg)
+            if version != Graphs.SEED_RANDOM_VERSION:
+                raise ValueError('Unsupported seed version ' + str(version))
+            if engine not in (Graphs.ENGINE_MATRIX, Graphs.ENGINE_PAIRING):
+                raise ValueError('Unknown graph engine ' + repr(engine))
+            if (num_graphs, vertices, degree) != (GRAPH_NUMBERS, GRAPH_VERTICES, GRAPH_DEGREE):
+                raise ValueError('Unexpected graph size ' + str((num_graphs, vertices, degree)))
+
+            graphs = GraphInvariants.random_certified_graphs(CERTIFIER, num_graphs, vertices, degree,
+                                                             self.graph_type, engine, Graphs.SeedRandom(seed))
+            if graphs is None or Graphs.graphs_digest(graphs) != digest:
+                raise ValueError('The generated graphs do not match the digest')
+            return graphs
+
+        pool = None
+        if self.workers is not None:
+            pool = self.workers.get_pool()
+
+        graphs = [self.new_graph(edges) for edges in GraphCodec.BatchReader(msg).all_edges(pool)]
+        if len(graphs) != GRAPH_NUMBERS:
+            raise ValueError('Unexpected number of graphs ' + str(len(graphs)))
+        return graphs
+
+    def remember_triple(self, msg, graphs):
+        """
+        Stores a triple and its graphs to reuse them. The least recently used triple is removed, if there are
+        more than TRIPLE_CACHE_SIZE triples.
+        :param msg: The batch message or the seed message of the triple.
+        :param graphs: The list of graph objects of the triple.
+        :return: The hash of the triple.
+        """
+        h = RPSNetwork.triple_hash(msg)
+        self.triples.pop(h, None)
+        self.triples[h] = msg
+        self.triple_graphs[h] = graphs
+        while len(self.triples) > TRIPLE_CACHE_SIZE:
+            old, _ = self.triples.popitem(last=False)
+            del self.triple_graphs[old]
+        return h
+
+    def stop_copy_pool(self):
+        """
+        Stops the copy pool, if there is one.
+        """
+        if self.copy_pool is not None:
+            self.copy_pool.stop()
+            self.copy_pool.join()
+            self.copy_pool = None
+
+    def close(self):
+        """
+        Stops the background threads and processes of this player and the server, that this player has started,
+        and closes the connection.
+        """
+        self.stop_copy_pool()
+        if self.workers is not None:
+            self.workers.close()
+            self.workers = None
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        if self.client is not None and self.client.sock is not None:
+            self.client.sock.close()
+
+    def isomorphic_copy(self, i):
+        """
+        Returns a random isomorphic copy of the graph at index i. The copy is taken from
+        the copy pool, if it is running.
+        :param i: The index of the graph.
+        :return: The isomorphic graph, The isomorphism.
+        """
+        if self.copy_pool is not None:
+            return self.copy_pool.take(i)
+        return self.graphs[i].isomorphic_copy()
+
     def get_graph_index(self, g):
         """
-        Returns the index of the given graph in the self.graphs list.
+        Returns the index of the given graph in the self.graphs list. The graphs are compared
+        by their fingerprints, so the order and orientation of the edges does not matter.
         :param g: The graph to find the index of.
         :return: The index of the graph or -1 if the graph is not found.
         """
-        for i in range(0, len(self.graphs)):
-            if (self.graphs[i]).edges == g.edges:
-                return i
-        return -1
+        return self.graph_index.get(g.fingerprint(), -1)
 
 
 def separator(num_lines):
@@ -180,6 +468,44 @@ def input_handler(req=REQ_STRING, prompt=''):
     return inp
 
 
+def say(player, msg):
+    """
+    Prints a message for the user. A player with a strategy has no user, so nothing is printed.
+    :param player: The player object.
+    :param msg: The message string.
+    """
+    if player.strategy is None:
+        print msg
+
+
+def notify(player, event, value, msg):
+    """
+    Reports an event of the game. An interactive player prints the message, a player with a strategy
+    appends the tuple (event, value) to player.events instead.
+    :param player: The player object.
+    :param event: One of the EVENT_ constants.
+    :param value: The value of the event.
+    :param msg: The message string for the user.
+    """
+    if player.strategy is None:
+        print msg
+    else:
+        player.events.append((event, value))
+
+
+def fail(player, msg):
+    """
+    Exits the game after an error. An interactive player prints the message and exits the program,
+    for a player with a strategy a ValueError is raised.
+    :param player: The player object.
+    :param msg: The error message.
+    """
+    if player.strategy is not None:
+        raise ValueError(msg)
+    print msg + ' The game is exited.'
+    sys.exit(1)
+
+
 def init():
     """
     Initializes the game. Asks for the user name and connection details. The server address can be None
@@ -199,7 +525,12 @@ def init():
     # Creates a new player object to store the name and a client object.
     player = Player()
     player.name = inp
-    player.client = RPSNetwork.RPSClient()
+    cache = RPSNetwork.DiscoveryCache(DISCOVERY_CACHE) if DISCOVERY_CACHE is not None else None
+    player.client = RPSNetwork.RPSClient(cache=cache)
+
+    # Opens the graph library, if there is one.
+    if GRAPH_LIBRARY is not None and os.path.exists(GRAPH_LIBRARY):
+        player.library = GraphLibrary.GraphLibrary(GRAPH_LIBRARY)
 
     # Asks for the server port.
     print 'Type the servers port'
@@ -225,15 +556,14 @@ def init():
         # Creates a new RPSServer
         server = RPSNetwork.RPSServer()
         # Starts new server threads
-        start_new_thread(server.start, (inp, inp))
+        server.start_background(inp, inp)
 
         # Wait for the server startup
-        time.sleep(2)
-
-        if not server.running:
+        if not server.wait_ready(SERVER_START_TIMEOUT):
             print 'Unable to start server'
             sys.exit(0)
         else:
+            player.server = server
             srv_addr = ('localhost', inp)
 
     separator(1)
@@ -248,16 +578,164 @@ def connect(player, srv_addr):
     :param srv_addr: Server address, port tuple.
     """
 
-    # Connects this player with the server and send the player name.
-    player.connect(srv_addr)
+    # Connects this player with the server
+    if not player.connect(srv_addr):
+        fail(player, 'Unable to connect with ' + str(srv_addr[0]) + '.')
+    say(player, 'Successfully connected with '+str(srv_addr[0]))
+
+    join(player)
+
+
+def join(player):
+    """
+    Sends the player name and the features to the server and waits in the lobby, until the server
+    has found an opponent.
+    :param player: The connected player object.
+    """
     player.send(player.name)
+    features = RPSNetwork.local_features()
+    if not COMMIT_TURNS:
+        features.remove(RPSNetwork.FEATURE_COMMIT)
+    player.send(RPSNetwork.features_msg(features))
 
-    print 'Successfully connected with '+str(srv_addr[0])
-    print 'Wait for other players'
+    say(player, 'Wait for other players')
 
     # Waits for the opponent
     opponents_name = player.receive()
-    print 'Your opponent is '+opponents_name
+    if opponents_name is None:
+        fail(player, 'The server is not accessible.')
+    player.opponent = opponents_name
+    notify(player, EVENT_OPPONENT, opponents_name, 'Your opponent is '+opponents_name)
+
+    # Applies the features, that both players support.
+    player.client.set_features(RPSNetwork.parse_features(player.receive()))
+
+
+def generate_graphs(player):
+    """
+    Creates GRAPH_NUMBERS random graphs, that are pairwise not isomorphic. The graphs are generated
+    by GRAPH_PROCESSES processes, if it is greater than 0.
+    :param player: The player object.
+    :return: A list of graph objects or None, if no graphs can be found.
+    """
+    if GRAPH_PROCESSES > 0:
+        if player.workers is None:
+            player.workers = GraphWorkers.GraphWorkers(GRAPH_PROCESSES)
+        return player.workers.generate(CERTIFIER, GRAPH_NUMBERS, GRAPH_VERTICES, GRAPH_DEGREE, player.graph_type,
+                                       GRAPH_ENGINE, speculative=GRAPH_SPECULATIVE)
+
+    return GraphInvariants.random_certified_graphs(CERTIFIER, GRAPH_NUMBERS, GRAPH_VERTICES, GRAPH_DEGREE,
+                                                   player.graph_type, GRAPH_ENGINE)
+
+
+def generate_seeded_graphs(player):
+    """
+    Creates GRAPH_NUMBERS random graphs, that are pairwise not isomorphic, with Graphs.SeedRandom and
+    a random seed. The opponent generates the same graphs from the seed message.
+    :param player: The player object.
+    :return: A tuple with the list of graph objects and the seed message or None, if no graphs can be found.
+    """
+    seed = random.getrandbits(63)
+    graphs = GraphInvariants.random_certified_graphs(CERTIFIER, GRAPH_NUMBERS, GRAPH_VERTICES, GRAPH_DEGREE,
+                                                     player.graph_type, GRAPH_ENGINE, Graphs.SeedRandom(seed))
+    if graphs is None:
+        return None
+
+    msg = GraphCodec.encode_seed(Graphs.SEED_RANDOM_VERSION, GRAPH_ENGINE, GRAPH_NUMBERS, GRAPH_VERTICES,
+                                 GRAPH_DEGREE, seed, Graphs.graphs_digest(graphs))
+    return graphs, msg
+
+
+def take_graphs(player):
+    """
+    Takes unused graphs from the library of the player or generates new graphs. A library, that was built
+    for other numbers of graphs, vertices or another degree, is not used. The graphs are generated
+    from a seed, if GRAPH_SEEDS is True and the opponent supports it. The game is exited, if no graphs
+    can be generated.
+    :param player: The player object.
+    :return: A tuple with a list of GRAPH_NUMBERS graph objects, that are not isomorphic, and the seed
+    message or None, if the graphs are not generated from a seed.
+    """
+    graphs = None
+    library = player.library
+    if (library is not None and
+            (library.num_graphs, library.vertices, library.degree) == (GRAPH_NUMBERS, GRAPH_VERTICES, GRAPH_DEGREE)):
+        # Takes pre-generated graphs, if there are unused triples in a library with the game's graph size.
+        graphs = library.take(player.graph_type)
+        if graphs is not None and not CERTIFIER.certify(graphs):
+            graphs = None
+    if graphs is not None:
+        return graphs, None
+
+    say(player, 'Generate graphs...')
+
+    # Creates new random graphs, that are not isomorphic
+    seeded = None
+    if GRAPH_SEEDS and RPSNetwork.FEATURE_SEED in player.client.features:
+        seeded = generate_seeded_graphs(player)
+    else:
+        graphs = generate_graphs(player)
+        if graphs is not None:
+            seeded = graphs, None
+
+    if seeded is None:
+        fail(player, 'Unable to generate graphs, that are not isomorphic.')
+
+    return seeded
+
+
+def offer_graphs(player):
+    """
+    Offers the last triple of the player to the server, or requests fresh graphs, if there is no triple
+    or GRAPH_REUSE is False. The offered triple is only sent, if neither the server nor the other player
+    holds it.
+    :param player: The player object.
+    :return: Whether the sharing was successfully or not.
+    """
+    h = ''
+    if GRAPH_REUSE and len(player.triples) > 0:
+        h = next(reversed(player.triples))
+        player.send(RPSNetwork.GRAPHS_OFFER + ' ' + h)
+    else:
+        player.send(RPSNetwork.GRAPHS_OFFER)
+
+    srv_req = player.receive()
+    if srv_req == RPSNetwork.GRAPHS_HAVE:
+        # The triple is not sent again
+        player.add_triple(player.triples[h])
+        notify(player, EVENT_GRAPHS, 'reused', 'The graphs of the last game are reused')
+        return True
+
+    if srv_req != RPSNetwork.GRAPHS_NEED:
+        return False
+
+    if h:
+        msg = player.triples[h]
+        player.add_triple(msg)
+    else:
+        graphs, msg = take_graphs(player)
+        for g in graphs:
+            player.add_graph(g)
+        if msg is None:
+            msg = GraphCodec.encode_batch([GraphCodec.encode_edges(g) for g in graphs])
+        player.remember_triple(msg, graphs)
+
+    player.client.send(msg)
+    notify(player, EVENT_GRAPHS, 'sent', 'All graphs sent')
+    return True
+
+
+def add_received_triple(player, msg):
+    """
+    Adds the graphs of a received batch or seed message, see Player.add_triple. The game is exited,
+    if the message is not correct.
+    :param player: The player object.
+    :param msg: The batch or seed message.
+    """
+    try:
+        player.add_triple(msg)
+    except ValueError, e:
+        fail(player, 'The received graphs are not correct: ' + str(e) + '.')
 
 
 def share_graphs(player):
@@ -268,49 +746,94 @@ def share_graphs(player):
     :return: Whether the sharing was successfully or not.
     """
 
-    separator(1)
+    if player.strategy is None:
+        separator(1)
 
     success = False
+    player.clear_graphs()
 
-    # Waits for the server response. There are two possible cases
+    # Waits for the server response. There are four possible cases
     # either, this player has to generate graphs
-    # or, this player gets graphs from the other player
+    # or, this player gets graphs from the other player one by one
+    # or, this player gets all graphs of the other player in one batch or as seed
+    # or, this player is asked, if it holds the triple of the other player
     srv_req = player.receive()
     if srv_req is not None:
 
-        if srv_req == RPSNetwork.GRAPHS_NEED:
+        if srv_req == RPSNetwork.GRAPHS_NEED and RPSNetwork.FEATURE_GRAPH_CACHE in player.client.features:
+            # This player offers a triple, that it holds, or sends fresh graphs
+            success = offer_graphs(player)
+
+        elif srv_req == RPSNetwork.GRAPHS_NEED:
             # This player has to generate graphs
             # Each graph is sent to the server
 
-            print 'Generate graphs...'
-
+            graphs, msg = take_graphs(player)
             for i in range(0, GRAPH_NUMBERS):
-                # Creates new random graphs
-                g = Graphs.random_graph(100, 2)
-                player.add_graph(g)
-                player.send_graph(i)
-
-            print 'All graphs sent'
+                player.add_graph(graphs[i])
+
+            if msg is not None:
+                # Sends only the seed of the graphs
+                player.client.send(msg)
+            elif RPSNetwork.FEATURE_BATCH in player.client.features:
+                # Sends all graphs in one message
+                payloads = [GraphCodec.encode_edges(g) for g in graphs]
+                player.client.send_chunks(GraphCodec.iter_encode_batch(payloads))
+            else:
+                for i in range(0, GRAPH_NUMBERS):
+                    player.send_graph(i)
+
+            notify(player, EVENT_GRAPHS, 'sent', 'All graphs sent')
             success = True
 
+        elif srv_req.startswith(RPSNetwork.GRAPHS_REUSE):
+            # The server asks, if this player holds the triple of the other player
+            h = srv_req[len(RPSNetwork.GRAPHS_REUSE) + 1:]
+            batch = player.triples.get(h)
+            if batch is not None:
+                player.send(RPSNetwork.GRAPHS_HAVE)
+            else:
+                player.send(RPSNetwork.GRAPHS_NEED)
+                batch = player.receive()
+
+            if batch is not None:
+                add_received_triple(player, batch)
+                notify(player, EVENT_GRAPHS, 'received', 'All graphs received')
+                success = True
+
         elif srv_req == RPSNetwork.GRAPHS_SEND_START:
             # This player receives graphs
 
-            srv_req = player.receive()
+            srv_req = player.receive_decoded()
 
-            while srv_req != RPSNetwork.GRAPHS_SEND_END:
+            while srv_req is not None and srv_req != RPSNetwork.GRAPHS_SEND_END:
                 # Receive graphs until the end request is received
 
-                player.load_graph(srv_req)
-                srv_req = player.receive()
+                if isinstance(srv_req, str):
+                    player.load_graph(srv_req)
+                else:
+                    player.add_graph(srv_req)
+                srv_req = player.receive_decoded()
 
-            print 'All graphs received'
+            notify(player, EVENT_GRAPHS, 'received', 'All graphs received')
+            success = True
+
+        elif GraphCodec.payload_type(srv_req) in (GraphCodec.TYPE_BATCH, GraphCodec.TYPE_SEED):
+            # This player receives all graphs in one batch or generates them from their seed
+            add_received_triple(player, srv_req)
+
+            notify(player, EVENT_GRAPHS, 'received', 'All graphs received')
             success = True
 
     else:
-        print 'The server is not accessible'
+        say(player, 'The server is not accessible')
 
-    separator(1)
+    if success and COPY_POOL_SIZE > 0:
+        # Prepares the isomorphic copies for the turns while the players are waiting.
+        player.start_copy_pool()
+
+    if player.strategy is None:
+        separator(1)
 
     return success
 
@@ -319,9 +842,15 @@ def ask_for_graph(player):
     """
     Lets the user choose a graph. This function checks the user input.
     As long as the input is not valid, the function asks for a new value.
+    A player with a strategy asks the strategy instead.
     :param player: The player object.
     :return: The chosen index.
     """
+    if player.strategy is not None:
+        i = player.strategy.choose(player)
+        if i not in range(0, GRAPH_NUMBERS):
+            raise ValueError('The strategy has chosen an invalid graph ' + str(i))
+        return i
 
     print 'Your turn. Choose an integer in the range 0 to 2'
     print 'The values stands for: 0-Rock, 1-Paper, 2-Scissor'
@@ -330,7 +859,7 @@ def ask_for_graph(player):
         print 'The input was not correct. Try again!'
         i = input_handler(REQ_INTEGER, 'Choice:')
 
-    print "You're choice " + ['Rock', 'Paper', 'Scissor'][i]
+    print "You're choice " + CHOICES[i]
 
     separator(1)
 
@@ -348,12 +877,84 @@ def ask_for_isomorphic_graph(player):
 
 def oppon_turn(player):
     """
-    Receives a request of the opponent and loads it with pickle.
+    Receives a request of the opponent and decodes it with GraphCodec. The game is exited, if the
+    request can not be decoded.
+    :param player: The player object.
+    :return: A graph object for an edge list or the isomorphism list.
+    """
+    say(player, 'Wait for opponents turn...')
+    try:
+        data = player.receive_decoded()
+        if data is None or isinstance(data, str):
+            return GraphCodec.decode_permutation(data or '')
+        return data
+    except ValueError:
+        fail(player, 'The received data is not correct.')
+
+
+def commit_graph(iso_g, i, iso):
+    """
+    Creates the commitment to an isomorphic copy of a graph and the message, that reveals it.
+    The commitment is the SHA-256 digest of a random nonce and the encoded edges of the copy.
+    :param iso_g: The isomorphic copy of the chosen graph.
+    :param i: The graph index of the choice.
+    :param iso: The isomorphism, that maps the chosen graph to iso_g.
+    :return: The commitment message, The reveal message.
+    """
+    nonce = os.urandom(COMMIT_NONCE_SIZE)
+    digest = hashlib.sha256(nonce)
+    for chunk in GraphCodec.iter_encode_edges(iso_g):
+        digest.update(chunk)
+    return (RPSNetwork.TURN_COMMIT + ' ' + digest.hexdigest(),
+            ' '.join([RPSNetwork.TURN_REVEAL, str(i), nonce.encode('hex'), GraphCodec.encode_permutation(iso)]))
+
+
+def parse_choice(msg, prefix, maxsplit=-1):
+    """
+    Reads the graph index of a choice or reveal message.
+    :param msg: The message or None.
+    :param prefix: The expected prefix, RPSNetwork.TURN_CHOICE or RPSNetwork.TURN_REVEAL.
+    :param maxsplit: The maximal number of splits of the message, see str.split.
+    :return: A list with the graph index and the other values of the message or None, if the message
+    is not correct.
+    """
+    if msg is None:
+        return None
+    values = msg.split(' ', maxsplit)
+    if values[0] != prefix or len(values) < 2 or values[1] not in [str(i) for i in range(0, GRAPH_NUMBERS)]:
+        return None
+    return [int(values[1])] + values[2:]
+
+
+def open_commitment(player, commitment, reveal):
+    """
+    Checks, that the revealed isomorphism maps the revealed graph to the graph, that the opponent has
+    committed to. The isomorphic copy is built from the own graph, so it is not sent.
     :param player: The player object.
-    :return: The pickle load result of the request.
+    :param commitment: The commitment message of the opponent or None.
+    :param reveal: The reveal message of the opponent or None.
+    :return: The graph index of the choice or -1, if the reveal does not match the commitment.
     """
-    print 'Wait for opponents turn...'
-    return pickle.loads(player.receive())
+    values = parse_choice(reveal, RPSNetwork.TURN_REVEAL, 3)
+    if commitment is None or values is None or len(values) != 3:
+        return -1
+
+    try:
+        nonce = values[1].decode('hex')
+        iso = GraphCodec.decode_permutation(values[2])
+    except (TypeError, ValueError):
+        return -1
+
+    g = player.get_graph(values[0])
+    if len(nonce) != COMMIT_NONCE_SIZE or g is None or len(iso) != g.num_vertices():
+        return -1
+
+    digest = hashlib.sha256(nonce)
+    for chunk in GraphCodec.iter_encode_edges(Graphs.apply_permutation(g, iso)):
+        digest.update(chunk)
+    if commitment != RPSNetwork.TURN_COMMIT + ' ' + digest.hexdigest():
+        return -1
+    return values[0]
 
 
 def calc_result(my_i, op_i):
@@ -370,59 +971,54 @@ def calc_result(my_i, op_i):
     :return: The game result.
     """
     res = RES_LOOSE
-    op_choice_txt = ""
     if my_i != op_i:
         if my_i == 0:
             # My choice was rock
 
             if op_i == 2:
                 # Opponent choose scissor
-
-                op_choice_txt = 'Scissor'
                 res = RES_WIN
         elif my_i == 1:
             # My choice was paper
 
             if op_i == 0:
                 # Opponent choose rock
-
-                op_choice_txt = 'Rock'
                 res = RES_WIN
         elif my_i == 2:
             # My choice was scissor
 
             if op_i == 1:
                 # Opponent choose paper
-
-                op_choice_txt = 'Paper'
                 res = RES_WIN
     else:
         res = RES_DRAW
 
-    print 'The opponent choose '+op_choice_txt
-
     return res
 
 
-def finish_turn(player, my_i, op_graph):
+def finish_turn(player, my_i, op_graph=None, op_i=-1, commitment=None, reveal=None):
     """
     Finish the current turn.
-    :param player: The player object. If the given graph is not valid, the game will be exited.
-    :param op_graph: The graph object of the opponent.
+    :param player: The player object. If the given graph or choice is not valid, the game will be exited.
+    :param my_i: The graph index of the own choice.
+    :param op_graph: The graph object of the opponent or None in a turn with commitments.
+    :param op_i: The graph index, that the opponent has chosen in a turn with commitments, or -1.
+    :param commitment: The commitment message of the opponent, that is checked against reveal, see
+    open_commitment, or None.
+    :param reveal: The reveal message of the opponent or None.
     """
-    op_i = player.get_graph_index(op_graph)
+    if op_graph is not None:
+        op_i = player.get_graph_index(op_graph)
+    elif commitment is not None:
+        op_i = open_commitment(player, commitment, reveal)
 
     if op_i == -1:
-        print 'The received graph is not correct. The game is exited.'
-        sys.exit(1)
-    else:
-        game_result = calc_result(my_i, op_i)
-        if game_result == RES_WIN:
-            print 'You won!'
-        elif game_result == RES_LOOSE:
-            print 'You loose...'
-        elif game_result == RES_DRAW:
-            print "It's a draw"
+        fail(player, 'The received graph is not correct.')
+
+    game_result = calc_result(my_i, op_i)
+    say(player, 'The opponent choose ' + CHOICES[op_i])
+    msg = {RES_WIN: 'You won!', RES_LOOSE: 'You loose...', RES_DRAW: "It's a draw"}[game_result]
+    notify(player, EVENT_TURN, (my_i, op_i, game_result), msg)
 
     return game_result
 
@@ -436,22 +1032,50 @@ def play(player):
     srv_req = player.receive()
     is_over = False
     game_result = None
-    if srv_req == RPSNetwork.TURN_NEED:
+    if srv_req == RPSNetwork.TURN_NEED and RPSNetwork.FEATURE_COMMIT in player.client.features:
+
+        # Asks for rock, paper or scissor and sends only the commitment to an isomorphic copy of the chosen graph.
+        choice = ask_for_graph(player)
+        my_iso_g, iso = player.isomorphic_copy(choice)
+        commitment, reveal = commit_graph(my_iso_g, choice, iso)
+        player.send(commitment)
+
+        # Receives the opponents choice and reveals the isomorphism.
+        say(player, 'Wait for opponents turn...')
+        op_choice = parse_choice(player.receive(), RPSNetwork.TURN_CHOICE)
+        player.send(reveal)
+
+        # Check if the game is over and determine the winner.
+        game_result = finish_turn(player, choice, op_i=op_choice[0] if op_choice is not None else -1)
+
+    elif srv_req == RPSNetwork.TURN_SEND and RPSNetwork.FEATURE_COMMIT in player.client.features:
+
+        # Receives the commitment of the opponent.
+        say(player, 'Wait for opponents turn...')
+        commitment = player.receive()
+
+        # Asks for rock, paper or scissor and sends the choice.
+        choice = ask_for_graph(player)
+        player.send(RPSNetwork.TURN_CHOICE + ' ' + str(choice))
+
+        # Receives the isomorphism of the opponent and checks it against the commitment.
+        say(player, 'Wait for opponents turn...')
+        game_result = finish_turn(player, choice, commitment=commitment, reveal=player.receive())
+
+    elif srv_req == RPSNetwork.TURN_NEED:
 
         # Asks for rock, paper or scissor.
         choice = ask_for_graph(player)
-        my_g = player.get_graph(choice)
 
         # A isomorphic copy of the chosen graph will be sent to the opponent.
-        my_iso_g, iso = my_g.isomorphic_copy()
-        dmp = pickle.dumps(my_iso_g)
-        player.send(dmp)
+        my_iso_g, iso = player.isomorphic_copy(choice)
+        player.send_edges(my_iso_g)
 
         # Receives the opponents chosen graph.
         op_g = oppon_turn(player)
 
         # Send the isomorphism
-        player.send(pickle.dumps(iso))
+        player.send(GraphCodec.encode_permutation(iso))
 
         # Check if the game is over and determine the winner.
         game_result = finish_turn(player, choice, op_g)
@@ -464,16 +1088,19 @@ def play(player):
         # Asks for rock, paper or scissor.
         choice = ask_for_graph(player)
         my_g = player.get_graph(choice)
-        dmp = pickle.dumps(my_g)
-        player.send(dmp)
+        player.send_edges(my_g)
 
         # Receives the opponents isomorphism
         op_iso = oppon_turn(player)
 
-        # Calculates the opponents graph back.
-        inv_func = Graphs.inv_permut_function(op_iso)
-        op_edges = Graphs.apply_isomorphism(op_g.edges, inv_func)
-        op_g = Graphs.Graph(op_edges)
+        # Calculates the opponents graph back. The isomorphism must map each vertex of the received graph.
+        if not isinstance(op_iso, list) or isinstance(op_g, list) or len(op_iso) != op_g.num_vertices():
+            fail(player, 'The received isomorphism is not correct.')
+        try:
+            op_edges = Graphs.apply_inverse_permutation(op_g, op_iso)
+        except ValueError:
+            fail(player, 'The received isomorphism is not correct.')
+        op_g = player.new_graph(op_edges)
 
         # Check if the game is over and determine the winner.
         game_result = finish_turn(player, choice, op_g)
@@ -489,21 +1116,30 @@ def play(player):
 def play_again(player):
     """
     Handles a regame. Asks the given player if he want to play again.
-    After that, it waits for the opponents answer.
+    After that, it waits for the opponents answer. If the opponent does not want to play again,
+    the player waits in the lobby of the server for a new opponent.
+    A player with a strategy asks the strategy instead of the user.
     :param player: The player object.
-    :return: True, if both players wants to play again.
+    :return: True, if the player plays again with the same or a new opponent.
     """
-    print 'Type a to play again'
-    again = input_handler(REQ_STRING, 'input: ')
+    if player.strategy is not None:
+        again = player.strategy.play_again(player)
+    else:
+        print 'Type a to play again'
+        again = input_handler(REQ_STRING, 'input: ') == 'a'
 
-    if again == 'a':
+    if again:
         player.send(RPSNetwork.PLAY_AGAIN_TRUE)
 
-        print 'Wait for the opponents response'
+        say(player, 'Wait for the opponents response')
         op_answer = player.receive()
 
         if op_answer == RPSNetwork.PLAY_AGAIN_TRUE:
             return True
+        elif op_answer is not None:
+            notify(player, EVENT_OPPONENT_LEFT, player.opponent, 'Your opponent left the game')
+            join(player)
+            return share_graphs(player)
     else:
         player.send(RPSNetwork.PLAY_AGAIN_FALSE)
 
@@ -0,0 +1,541 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import sys
+from array import array
+
+#
+# The first byte of each encoded payload. It is not an ASCII character, so a payload can not be
+# mistaken for a protocol message of RPSNetwork.
+#
+MAGIC = '\x93'
+
+#
+# The version of the encoding.
+#
+VERSION = 1
+
+#
+# Payload type: An edge list. The edges are normalized, sorted and delta-encoded as varints.
+#
+TYPE_EDGES = 1
+
+#
+# Payload type: An isomorphism list. The values are stored as fixed-width little-endian integers.
+#
+TYPE_PERMUTATION = 2
+
+#
+# Payload type: A batch of encoded payloads. A table with the offsets of the payloads follows the
+# header, so each payload can be decoded on its own.
+#
+TYPE_BATCH = 3
+
+#
+# Payload type: The parameters and the seed of graphs, that are generated with Graphs.SeedRandom, and
+# the digest of the graphs, see Graphs.graphs_digest.
+#
+TYPE_SEED = 4
+
+#
+# The default chunk size of iter_encode_edges in bytes.
+#
+CHUNK_SIZE = 16384
+
+#
+# The array type codes for the fixed-width integers.
+#
+TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+
+#
+# The maximal number of bytes of a varint. Longer varints are rejected, so a received payload
+# can not create arbitrary large integers.
+#
+MAX_VARINT_BYTES = 10
+
+
+def encode_varint(buf, n):
+    """
+    Appends the given non-negative integer as LEB128 varint to the given buffer.
+    :param buf: A bytearray.
+    :param n: The integer.
+    """
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def decode_varint(data, pos):
+    """
+    Reads a LEB128 varint from the given data.
+    :param data: A bytearray.
+    :param pos: The position of the first byte.
+    :return: The integer and the position after the varint.
+    """
+    n = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError('Truncated varint')
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+        if shift >= 7 * MAX_VARINT_BYTES:
+            raise ValueError('Varint too long')
+
+
+def read_varint(data, pos):
+    """
+    Reads a LEB128 varint like decode_varint, but returns None if the varint is incomplete.
+    A varint longer than MAX_VARINT_BYTES raises a ValueError.
+    :param data: A bytearray.
+    :param pos: The position of the first byte.
+    :return: The integer and the position after the varint or None.
+    """
+    n = 0
+    shift = 0
+    end = len(data)
+    while pos < end:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+        if shift >= 7 * MAX_VARINT_BYTES:
+            raise ValueError('Varint too long')
+    return None
+
+
+def header(payload_type):
+    """
+    Creates the header of a payload.
+    :param payload_type: The payload type, one of the TYPE_ constants.
+    :return: A bytearray with the header.
+    """
+    buf = bytearray(MAGIC)
+    buf.append(VERSION)
+    buf.append(payload_type)
+    return buf
+
+
+def payload_type(data):
+    """
+    Returns the type of the given payload.
+    :param data: The encoded payload.
+    :return: One of the TYPE_ constants or None, if the data is not an encoded payload.
+    """
+    if len(data) < 3 or data[0:1] != MAGIC:
+        return None
+    if ord(data[1:2]) != VERSION:
+        raise ValueError('Unsupported codec version ' + str(ord(data[1:2])))
+    return ord(data[2:3])
+
+
+def encode_edges(edges):
+    """
+    Encodes the given edge list. The edges are normalized and sorted, so the order and orientation
+    of the edges is not kept. The first vertex of each edge is stored as difference to the first
+    vertex of the previous edge, the second vertex as difference to the first vertex or, if the first
+    vertices are equal, to the second vertex of the previous edge.
+    :param edges: A list of tuples, a Graph or a CompactGraph object.
+    :return: The encoded string.
+    """
+    return ''.join(iter_encode_edges(edges))
+
+
+def iter_encode_edges(edges, chunk_size=CHUNK_SIZE):
+    """
+    Encodes the given edge list like encode_edges, but returns the encoded string in chunks.
+    :param edges: A list of tuples, a Graph or a CompactGraph object.
+    :param chunk_size: The minimal size of each chunk, except the last one.
+    :return: A generator of strings.
+    """
+    if hasattr(edges, 'edges'):
+        edges = edges.edges
+
+    keys = sorted((u, v) if u <= v else (v, u) for (u, v) in edges)
+
+    buf = header(TYPE_EDGES)
+    encode_varint(buf, len(keys))
+
+    prev_u = 0
+    prev_v = 0
+    for (u, v) in keys:
+        if u == prev_u:
+            encode_varint(buf, 0)
+            encode_varint(buf, v - prev_v)
+        else:
+            encode_varint(buf, u - prev_u)
+            encode_varint(buf, v - u)
+        prev_u = u
+        prev_v = v
+
+        if len(buf) >= chunk_size:
+            yield str(buf)
+            buf = bytearray()
+
+    yield str(buf)
+
+
+def decode_edges(data):
+    """
+    Decodes an edge list encoded by encode_edges.
+    :param data: The encoded string.
+    :return: A list of tuples.
+    """
+    decoder = EdgeDecoder()
+    decoder.feed(data)
+    return decoder.finish()
+
+
+class EdgeDecoder:
+    """
+    This class decodes an edge list encoded by encode_edges chunk by chunk. Only the bytes of an
+    incomplete edge are kept between two chunks.
+    """
+    def __init__(self):
+        """
+        Creates a new EdgeDecoder object.
+        """
+        self.pending = bytearray()
+        self.count = None
+        self.edges = []
+        self.u = 0
+        self.v = 0
+
+    def feed(self, chunk):
+        """
+        Decodes the edges in the given chunk.
+        :param chunk: The next string chunk of the encoded edge list.
+        """
+        data = self.pending + bytearray(chunk)
+        pos = 0
+
+        if self.count is None:
+            if len(data) < 3:
+                self.pending = data
+                return
+            if payload_type(str(data[0:3])) != TYPE_EDGES:
+                raise ValueError('The data is not an encoded edge list')
+            count = read_varint(data, 3)
+            if count is None:
+                self.pending = data
+                return
+            self.count, pos = count
+
+        edges = self.edges
+        u = self.u
+        v = self.v
+        while pos < len(data):
+            if len(edges) == self.count:
+                raise ValueError('Unexpected data after the edge list')
+            du = read_varint(data, pos)
+            if du is None:
+                break
+            dv = read_varint(data, du[1])
+            if dv is None:
+                break
+            if dv[0] == 0:
+                # The edges are sorted and unique, so only a loop or a repeated edge has no difference.
+                raise ValueError('Loop or duplicate edge in the edge list')
+            if du[0] == 0:
+                v += dv[0]
+            else:
+                u += du[0]
+                v = u + dv[0]
+            edges.append((u, v))
+            pos = dv[1]
+
+        self.u = u
+        self.v = v
+        self.pending = data[pos:]
+
+    def finish(self):
+        """
+        Checks that the whole edge list was decoded.
+        :return: A list of tuples.
+        """
+        if self.count is None or len(self.edges) != self.count or len(self.pending) > 0:
+            raise ValueError('Truncated edge list')
+        return self.edges
+
+
+def encode_permutation(L):
+    """
+    Encodes the given isomorphism list. All values are stored with the width of the highest value.
+    :param L: The isomorphism list.
+    :return: The encoded string.
+    """
+    width = 1
+    if len(L) > 0x100:
+        width = 2
+    if len(L) > 0x10000:
+        width = 4
+
+    a = array(TYPECODES[width], L)
+    if sys.byteorder == 'big':
+        a.byteswap()
+
+    buf = header(TYPE_PERMUTATION)
+    encode_varint(buf, len(L))
+    buf.append(width)
+    return str(buf) + a.tostring()
+
+
+def decode_permutation(data):
+    """
+    Decodes an isomorphism list encoded by encode_permutation. The list is checked to be a
+    permutation of 0 to n - 1.
+    :param data: The encoded string.
+    :return: The isomorphism list.
+    """
+    if payload_type(data) != TYPE_PERMUTATION:
+        raise ValueError('The data is not an encoded permutation')
+
+    count, pos = decode_varint(bytearray(data[:16]), 3)
+    if pos >= len(data):
+        raise ValueError('Truncated permutation')
+    width = ord(data[pos])
+    pos += 1
+    if width not in TYPECODES or len(data) - pos != count * width:
+        raise ValueError('Invalid permutation size')
+
+    a = array(TYPECODES[width])
+    a.fromstring(data[pos:])
+    if sys.byteorder == 'big':
+        a.byteswap()
+
+    L = a.tolist()
+    if sorted(L) != range(0, count):
+        raise ValueError('The data is not a permutation')
+    return L
+
+
+def encode_seed(version, engine, num_graphs, vertices, degree, seed, digest):
+    """
+    Encodes the parameters of seeded graphs.
+    :param version: The version of Graphs.SeedRandom.
+    :param engine: The engine of Graphs.random_graph.
+    :param num_graphs: The number of graphs.
+    :param vertices: The number of vertices of each graph.
+    :param degree: The degree of each vertex.
+    :param seed: The seed of Graphs.SeedRandom.
+    :param digest: The hex digest of the graphs, see Graphs.graphs_digest.
+    :return: The encoded string.
+    """
+    buf = header(TYPE_SEED)
+    for n in (version, num_graphs, vertices, degree, seed, len(engine)):
+        encode_varint(buf, n)
+    buf.extend(engine)
+    buf.extend(digest.decode('hex'))
+    return str(buf)
+
+
+def decode_seed(data):
+    """
+    Decodes the parameters of seeded graphs encoded by encode_seed.
+    :param data: The encoded string.
+    :return: A tuple with the version, the engine, the number of graphs, the vertices, the degree,
+    the seed and the hex digest.
+    """
+    if payload_type(data) != TYPE_SEED:
+        raise ValueError('The data is not an encoded seed')
+
+    buf = bytearray(data)
+    values = []
+    pos = 3
+    for i in range(0, 6):
+        n, pos = decode_varint(buf, pos)
+        values.append(n)
+    version, num_graphs, vertices, degree, seed, engine_len = values
+
+    if len(data) - pos != engine_len + 20:
+        raise ValueError('Invalid seed size')
+    engine = data[pos:pos + engine_len]
+    digest = data[pos + engine_len:].encode('hex')
+    return version, engine, num_graphs, vertices, degree, seed, digest
+
+
+def iter_encode_batch(payloads, chunk_size=CHUNK_SIZE):
+    """
+    Encodes the given payloads as one batch. The batch consists of the header, the number of payloads
+    and a table with count + 1 offsets, all as little-endian 4-byte integers. The offsets are relative
+    to the end of the table. The payloads follow the table.
+    :param payloads: A list of encoded strings, e.g. from encode_edges.
+    :param chunk_size: The maximal size of each chunk.
+    :return: A generator of strings.
+    """
+    table = array('I', [len(payloads)])
+    offset = 0
+    for p in payloads:
+        table.append(offset)
+        offset += len(p)
+    table.append(offset)
+    if sys.byteorder == 'big':
+        table.byteswap()
+
+    yield str(header(TYPE_BATCH)) + table.tostring()
+    for p in payloads:
+        for i in xrange(0, len(p), chunk_size):
+            yield p[i:i + chunk_size]
+
+
+def encode_batch(payloads):
+    """
+    Encodes the given payloads as one batch, see iter_encode_batch.
+    :param payloads: A list of encoded strings.
+    :return: The encoded string.
+    """
+    return ''.join(iter_encode_batch(payloads))
+
+
+class BatchReader:
+    """
+    This class reads a batch encoded by encode_batch. The payloads are decoded on request only.
+    """
+    def __init__(self, data):
+        """
+        Creates a new BatchReader object. The offset table is checked.
+        :param data: The encoded batch string.
+        """
+        if payload_type(data) != TYPE_BATCH:
+            raise ValueError('The data is not an encoded batch')
+        if len(data) < 7:
+            raise ValueError('Truncated batch')
+
+        count = array('I')
+        count.fromstring(data[3:7])
+        if sys.byteorder == 'big':
+            count.byteswap()
+        count = count[0]
+
+        self.base = 7 + (count + 1) * 4
+        if len(data) < self.base:
+            raise ValueError('Truncated batch')
+
+        self.offsets = array('I')
+        self.offsets.fromstring(data[7:self.base])
+        if sys.byteorder == 'big':
+            self.offsets.byteswap()
+
+        prev = 0
+        for o in self.offsets:
+            if o < prev:
+                raise ValueError('Invalid batch offsets')
+            prev = o
+        if self.base + prev != len(data) or (count > 0 and self.offsets[0] != 0):
+            raise ValueError('Invalid batch size')
+
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def payload(self, i):
+        """
+        Returns the encoded payload at index i.
+        :param i: The index of the payload.
+        :return: The encoded string.
+        """
+        return self.data[self.base + self.offsets[i]:self.base + self.offsets[i + 1]]
+
+    def edges(self, i):
+        """
+        Decodes the edge list at index i.
+        :param i: The index of the payload.
+        :return: A list of tuples.
+        """
+        return decode_edges(self.payload(i))
+
+    def all_edges(self, pool=None):
+        """
+        Decodes all edge lists of the batch.
+        :param pool: A multiprocessing.Pool to decode the payloads in parallel or None.
+        :return: A list of edge lists.
+        """
+        payloads = [self.payload(i) for i in range(0, len(self))]
+        if pool is not None:
+            return pool.map(decode_edges, payloads)
+        return [decode_edges(p) for p in payloads]
+
+
+def decode(data):
+    """
+    Decodes the given payload according to its type.
+    :param data: The encoded string.
+    :return: A list of tuples for TYPE_EDGES, an isomorphism list for TYPE_PERMUTATION, a
+    BatchReader for TYPE_BATCH or a tuple for TYPE_SEED.
+    """
+    t = payload_type(data)
+    if t == TYPE_EDGES:
+        return decode_edges(data)
+    elif t == TYPE_PERMUTATION:
+        return decode_permutation(data)
+    elif t == TYPE_BATCH:
+        return BatchReader(data)
+    elif t == TYPE_SEED:
+        return decode_seed(data)
+    raise ValueError('Unknown payload type')
+
+
+def benchmark(vertices, degree, rounds=10):
+    """
+    Compares the size and the encoding and decoding time of this codec with pickle. The round trip
+    of each payload is checked.
+    :param vertices: The number of vertices of the graph.
+    :param degree: The degree of each vertex.
+    :param rounds: The number of encodings and decodings to measure.
+    :return: A list of (name, codec size, pickle size, codec time, pickle time) tuples.
+    """
+    import pickle, random, time, Graphs
+
+    g = Graphs.random_graph(vertices, degree, engine=Graphs.ENGINE_PAIRING)
+    L = list(range(vertices))
+    random.shuffle(L)
+
+    cases = [('edges', g.edges, encode_edges, decode_edges, sorted(g.edges)),
+             ('permutation', L, encode_permutation, decode_permutation, L)]
+
+    results = []
+    for name, value, enc, dec, expected in cases:
+        data = enc(value)
+        if dec(data) != expected:
+            raise AssertionError('Round trip failed for ' + name)
+
+        start = time.time()
+        for i in range(0, rounds):
+            dec(enc(value))
+        codec_time = (time.time() - start) / rounds
+
+        start = time.time()
+        for i in range(0, rounds):
+            pickle.loads(pickle.dumps(value))
+        pickle_time = (time.time() - start) / rounds
+
+        results.append((name, len(data), len(pickle.dumps(value)), codec_time, pickle_time))
+    return results
+
+
+if __name__ == '__main__':
+    for v, d in [(100, 2), (1000, 3), (10000, 4)]:
+        for name, size, pickle_size, t, pickle_t in benchmark(v, d):
+            print '%5d vertices, degree %d, %-11s: %8d bytes %7.2f ms | pickle %8d bytes %7.2f ms' % (
+                v, d, name, size, t * 1000, pickle_size, pickle_t * 1000)
@@ -0,0 +1,258 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import Graphs, random
+
+#
+# Tier: The sorted degree sequences differ.
+#
+TIER_DEGREES = 'degrees'
+
+#
+# Tier: The multisets of component sizes differ. For 2-regular graphs these are the cycle lengths.
+#
+TIER_COMPONENTS = 'components'
+
+#
+# Tier: Weisfeiler-Leman color refinement results in different color histograms.
+#
+TIER_WL = 'wl'
+
+#
+# No tier could tell the graphs apart. They may be isomorphic.
+#
+TIER_UNDECIDED = 'undecided'
+
+#
+# The tiers in the order they are checked.
+#
+TIERS = [TIER_DEGREES, TIER_COMPONENTS, TIER_WL, TIER_UNDECIDED]
+
+#
+# The number of graphs that random_certified_graphs creates at most to replace colliding graphs.
+#
+MAX_REPLACEMENTS = 100
+
+
+class Invariants:
+    """
+    This class calculates the invariants of a graph. Each invariant is calculated on the first
+    request only, so expensive invariants are skipped if a cheaper one already decides.
+    """
+    def __init__(self, g):
+        """
+        Creates a new Invariants object.
+        :param g: A Graph or CompactGraph object.
+        """
+        self.g = g
+        self._degrees = None
+        self._components = None
+        self._wl = None
+
+    def degrees(self):
+        """
+        Returns the sorted degree sequence.
+        :return: A list of degrees.
+        """
+        if self._degrees is None:
+            self._degrees = sorted(self.g.deg(v) for v in self.g.vertices())
+        return self._degrees
+
+    def components(self):
+        """
+        Returns the sorted list of (vertices, edges) tuples of the connected components.
+        :return: A list of tuples.
+        """
+        if self._components is None:
+            components = []
+            visited = set()
+            for start in self.g.vertices():
+                if start in visited:
+                    continue
+
+                visited.add(start)
+                stack = [start]
+                num_vertices = 0
+                sum_deg = 0
+                while len(stack) > 0:
+                    v = stack.pop()
+                    num_vertices += 1
+                    neighbors = self.g.neighbors(v)
+                    sum_deg += len(neighbors)
+                    for w in neighbors:
+                        if w not in visited:
+                            visited.add(w)
+                            stack.append(w)
+
+                components.append((num_vertices, sum_deg / 2))
+            self._components = sorted(components)
+        return self._components
+
+    def wl(self):
+        """
+        Returns the color histograms of the 1-dimensional Weisfeiler-Leman refinement, one per round.
+        The start colors are given by local_color.
+        The colors are hashes of the previous color and the sorted neighbor colors, so the histograms
+        of different graphs can be compared. The refinement stops if the number of colors is stable.
+        :return: A list of sorted (color, count) lists.
+        """
+        if self._wl is None:
+            vertices = self.g.vertices()
+            colors = dict((v, local_color(self.g, v)) for v in vertices)
+            histograms = [histogram(colors)]
+            num_colors = len(histograms[0])
+
+            for r in range(0, len(vertices)):
+                colors = dict((v, hash((colors[v], tuple(sorted(colors[w] for w in self.g.neighbors(v))))))
+                              for v in vertices)
+                histograms.append(histogram(colors))
+                if len(histograms[-1]) == num_colors:
+                    break
+                num_colors = len(histograms[-1])
+
+            self._wl = histograms
+        return self._wl
+
+
+def local_color(g, v):
+    """
+    Returns the start color of a vertex for the refinement: the degree, the number of edges between
+    the neighbors and the number of vertices at distance two. Plain degrees would give the same color
+    to every vertex of a regular graph, so the refinement could never tell regular graphs apart.
+    :param g: The graph.
+    :param v: The vertex.
+    :return: A tuple of ints.
+    """
+    neighbors = g.neighbors(v)
+    closed = set(neighbors)
+    closed.add(v)
+    triangles = 0
+    second = set()
+    for w in neighbors:
+        for x in g.neighbors(w):
+            if x not in closed:
+                second.add(x)
+            elif x != v:
+                triangles += 1
+    return len(neighbors), triangles / 2, len(second)
+
+
+def histogram(colors):
+    """
+    Counts the vertices of each color.
+    :param colors: A dict that maps each vertex to its color.
+    :return: A sorted list of (color, count) tuples.
+    """
+    counts = {}
+    for c in colors.itervalues():
+        counts[c] = counts.get(c, 0) + 1
+    return sorted(counts.iteritems())
+
+
+class Certifier:
+    """
+    This class certifies, that graphs are not isomorphic. The invariants are checked from cheap to
+    expensive, see TIERS. The counters store how often each tier decided.
+    """
+    def __init__(self):
+        """
+        Creates a new Certifier object.
+        """
+        self.counters = dict((tier, 0) for tier in TIERS)
+
+    def decide(self, a, b):
+        """
+        Compares the invariants of two graphs.
+        :param a: The Invariants object of the first graph.
+        :param b: The Invariants object of the second graph.
+        :return: The tier that proves the graphs are not isomorphic or TIER_UNDECIDED.
+        """
+        if a.degrees() != b.degrees():
+            tier = TIER_DEGREES
+        elif a.components() != b.components():
+            tier = TIER_COMPONENTS
+        elif a.wl() != b.wl():
+            tier = TIER_WL
+        else:
+            tier = TIER_UNDECIDED
+
+        self.counters[tier] += 1
+        return tier
+
+    def non_isomorphic(self, g1, g2):
+        """
+        Checks if the two graphs are certainly not isomorphic.
+        :param g1: The first graph.
+        :param g2: The second graph.
+        :return: True, if an invariant proves that the graphs are not isomorphic.
+        """
+        return self.decide(Invariants(g1), Invariants(g2)) != TIER_UNDECIDED
+
+    def find_collision(self, graphs):
+        """
+        Compares each pair of the given graphs.
+        :param graphs: A list of graph objects.
+        :return: The index of the second graph of the first pair that can not be told apart or -1.
+        """
+        invariants = [Invariants(g) for g in graphs]
+        for j in range(1, len(graphs)):
+            for i in range(0, j):
+                if self.decide(invariants[i], invariants[j]) == TIER_UNDECIDED:
+                    return j
+        return -1
+
+    def certify(self, graphs):
+        """
+        Checks if all given graphs are pairwise not isomorphic.
+        :param graphs: A list of graph objects.
+        :return: True, if each pair is certainly not isomorphic.
+        """
+        return self.find_collision(graphs) == -1
+
+    def report(self):
+        """
+        Returns the counters as string.
+        :return: A string with the number of decisions of each tier.
+        """
+        return ', '.join(tier + ': ' + str(self.counters[tier]) for tier in TIERS)
+
+
+def random_certified_graphs(certifier, num_graphs, vertices, degree, graph_type=Graphs.Graph,
+                            engine=Graphs.ENGINE_MATRIX, rng=random):
+    """
+    Creates random graphs that are pairwise not isomorphic. A graph that can not be told apart
+    from another graph is replaced by a new random graph.
+    :param certifier: The Certifier object.
+    :param num_graphs: The number of graphs.
+    :param vertices: The number of vertices of each graph.
+    :param degree: The degree of each vertex.
+    :param graph_type: The graph class to create, see Graphs.random_graph.
+    :param engine: The generator, see Graphs.random_graph.
+    :param rng: The random number generator, see Graphs.random_graph.
+    :return: A list of graph objects or None, if there are still collisions after MAX_REPLACEMENTS graphs.
+    """
+    graphs = [Graphs.random_graph(vertices, degree, graph_type, engine, rng) for i in range(0, num_graphs)]
+
+    j = certifier.find_collision(graphs)
+    replacements = 0
+    while j != -1:
+        if replacements == MAX_REPLACEMENTS:
+            return None
+        graphs[j] = Graphs.random_graph(vertices, degree, graph_type, engine, rng)
+        replacements += 1
+        j = certifier.find_collision(graphs)
+
+    return graphs
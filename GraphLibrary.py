@@ -0,0 +1,296 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import os, sys, mmap, struct, threading, argparse, Graphs, GraphInvariants, GraphWorkers
+from array import array
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl, the library is only locked between the threads of one process.
+    fcntl = None
+
+#
+# The first bytes of a graph library file.
+#
+MAGIC = 'RPSL'
+
+#
+# The version of the file format.
+#
+VERSION = 1
+
+#
+# The file header: magic, version, graphs per triple, vertex width in bytes, vertices, degree,
+# edges per graph, index of the next unused triple. All values are little-endian.
+#
+HEADER = struct.Struct('<4sHHHIIII')
+
+#
+# The byte offset of the next-triple field in the header.
+#
+NEXT_OFFSET = HEADER.size - 4
+
+#
+# The array type codes for the vertex widths.
+#
+TYPECODES = {2: 'H', 4: 'I'}
+
+
+def vertex_width(vertices):
+    """
+    Returns the number of bytes to store a vertex of a graph with the given number of vertices.
+    :param vertices: The number of vertices.
+    :return: 2 or 4.
+    """
+    if vertices <= 0xFFFF:
+        return 2
+    return 4
+
+
+def pack_edges(edges, width):
+    """
+    Packs the given edge list into a little-endian byte string.
+    :param edges: A list of tuples.
+    :param width: The number of bytes per vertex.
+    :return: The byte string.
+    """
+    a = array(TYPECODES[width])
+    for (u, v) in edges:
+        a.append(u)
+        a.append(v)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a.tostring()
+
+
+def unpack_edges(data, width):
+    """
+    Unpacks a byte string created by pack_edges.
+    :param data: The byte string.
+    :param width: The number of bytes per vertex.
+    :return: [0] An array with the first vertex of each edge, [1] an array with the second vertex.
+    """
+    a = array(TYPECODES[width])
+    a.fromstring(data)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a[0::2], a[1::2]
+
+
+def append_triples(path, triples, vertices, degree):
+    """
+    Appends the given graph triples to the library file. The file is created if it does not exist.
+    :param path: The path of the library file.
+    :param triples: A list of graph lists. Each graph must be a Graph or CompactGraph object.
+    :param vertices: The number of vertices of each graph.
+    :param degree: The degree of each vertex.
+    """
+    num_graphs = len(triples[0]) if len(triples) > 0 else 0
+    num_edges = vertices * degree / 2
+    width = vertex_width(vertices)
+
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, num_graphs, width, vertices, degree, num_edges, 0))
+    else:
+        with open(path, 'rb') as f:
+            header = read_header(f.read(HEADER.size))
+        if header[1:6] != (num_graphs, width, vertices, degree, num_edges):
+            raise ValueError('The graphs do not match the library ' + path)
+
+    with open(path, 'ab') as f:
+        for triple in triples:
+            for g in triple:
+                edges = g.edges
+                if len(edges) != num_edges:
+                    raise ValueError('The graph has not ' + str(num_edges) + ' edges')
+                f.write(pack_edges(edges, width))
+
+
+def read_header(data):
+    """
+    Reads and checks the header of a library file.
+    :param data: The first HEADER.size bytes of the file.
+    :return: A tuple with the version, graphs per triple, vertex width, vertices, degree,
+    edges per graph and the next triple index.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError('The file is not a graph library')
+    header = HEADER.unpack(data[:HEADER.size])
+    if header[0] != MAGIC:
+        raise ValueError('The file is not a graph library')
+    if header[1] != VERSION:
+        raise ValueError('Unsupported graph library version ' + str(header[1]))
+    return header[1:]
+
+
+def generate(path, count, vertices, degree, num_graphs, engine=Graphs.ENGINE_PAIRING, processes=0):
+    """
+    Generates random graph triples and appends them to the library file. The graphs of each triple
+    are certified to be pairwise not isomorphic, see GraphInvariants.
+    :param path: The path of the library file.
+    :param count: The number of triples to generate.
+    :param vertices: The number of vertices of each graph.
+    :param degree: The degree of each vertex.
+    :param num_graphs: The number of graphs per triple.
+    :param engine: The generator, see Graphs.random_graph.
+    :param processes: The number of processes that generate the graphs. 0 generates the graphs in this process.
+    """
+    certifier = GraphInvariants.Certifier()
+    workers = None
+    if processes > 0:
+        workers = GraphWorkers.GraphWorkers(processes)
+
+    for i in range(0, count):
+        if workers is not None:
+            triple = workers.generate(certifier, num_graphs, vertices, degree, Graphs.CompactGraph, engine)
+        else:
+            triple = GraphInvariants.random_certified_graphs(certifier, num_graphs, vertices, degree,
+                                                             Graphs.CompactGraph, engine)
+        if triple is None:
+            raise ValueError('Unable to generate ' + str(num_graphs) + ' non-isomorphic graphs')
+        append_triples(path, [triple], vertices, degree)
+
+    if workers is not None:
+        workers.close()
+
+
+class GraphLibrary:
+    """
+    This class represents a reader for a graph library file. The file is memory-mapped and each
+    triple is taken only once. The index of the next unused triple is stored in the file header,
+    so the triples are not reused by another process or after a restart.
+    """
+    def __init__(self, path):
+        """
+        Opens the given library file.
+        :param path: The path of the library file.
+        """
+        self.path = path
+        self.file = open(path, 'r+b')
+        self.lock = threading.Lock()
+        self.mm = None
+        self.map()
+
+        header = read_header(self.mm[:HEADER.size])
+        self.num_graphs = header[1]
+        self.width = header[2]
+        self.vertices = header[3]
+        self.degree = header[4]
+        self.num_edges = header[5]
+        self.graph_size = self.num_edges * 2 * self.width
+        self.record_size = self.graph_size * self.num_graphs
+
+    def map(self):
+        """
+        Maps the whole file into memory. This is invoked again, if the file has grown.
+        """
+        if self.mm is not None:
+            self.mm.close()
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def count(self):
+        """
+        Returns the number of triples in the mapped file.
+        :return: The number of triples.
+        """
+        if self.record_size == 0:
+            return 0
+        return (len(self.mm) - HEADER.size) / self.record_size
+
+    def remaining(self):
+        """
+        Returns the number of unused triples.
+        :return: The number of unused triples.
+        """
+        with self.lock:
+            return max(self.count() - self.next_index(), 0)
+
+    def next_index(self):
+        """
+        Returns the index of the next unused triple.
+        :return: The triple index.
+        """
+        return struct.unpack_from('<I', self.mm, NEXT_OFFSET)[0]
+
+    def take(self, graph_type=Graphs.Graph):
+        """
+        Takes the next unused triple from the library.
+        :param graph_type: The graph class to create, Graphs.Graph or Graphs.CompactGraph.
+        :return: A list of graph objects or None, if all triples are used.
+        """
+        with self.lock:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            try:
+                i = self.next_index()
+                if i >= self.count() and os.fstat(self.file.fileno()).st_size > len(self.mm):
+                    # More triples were appended since the file was mapped.
+                    self.map()
+                if i >= self.count():
+                    return None
+
+                struct.pack_into('<I', self.mm, NEXT_OFFSET, i + 1)
+                start = HEADER.size + i * self.record_size
+                record = self.mm[start:start + self.record_size]
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+        graphs = []
+        for j in range(0, self.num_graphs):
+            heads, tails = unpack_edges(record[j * self.graph_size:(j + 1) * self.graph_size], self.width)
+            if graph_type is Graphs.CompactGraph:
+                graphs.append(Graphs.CompactGraph.from_arrays(array('I', heads), array('I', tails)))
+            else:
+                graphs.append(graph_type(zip(heads, tails)))
+        return graphs
+
+    def close(self):
+        """
+        Closes the memory map and the file.
+        """
+        self.mm.close()
+        self.file.close()
+
+
+def main(argv):
+    """
+    Command line tool to generate graph triples offline.
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Generates random graph triples for a graph library file.')
+    parser.add_argument('path', help='the library file, new triples are appended')
+    parser.add_argument('count', type=int, help='the number of triples to generate')
+    parser.add_argument('--vertices', type=int, default=100, help='the number of vertices of each graph')
+    parser.add_argument('--degree', type=int, default=2, help='the degree of each vertex')
+    parser.add_argument('--graphs', type=int, default=3, help='the number of graphs per triple')
+    parser.add_argument('--engine', default=Graphs.ENGINE_PAIRING,
+                        choices=[Graphs.ENGINE_PAIRING, Graphs.ENGINE_MATRIX], help='the graph generator')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='the number of processes that generate graphs, 0 generates in this process')
+    args = parser.parse_args(argv)
+
+    generate(args.path, args.count, args.vertices, args.degree, args.graphs, args.engine, args.processes)
+
+    library = GraphLibrary(args.path)
+    print str(library.remaining()) + ' unused triples in ' + args.path
+    library.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,118 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import threading
+from collections import deque
+
+#
+# The default number of prepared copies per graph.
+#
+DEFAULT_SIZE = 4
+
+#
+# The default low watermark. The pool refills a graph, if it has less prepared copies.
+#
+DEFAULT_LOW_WATERMARK = 2
+
+
+class CopyPool(threading.Thread):
+    """
+    This class represents a thread that prepares random isomorphic copies of graphs. The copies
+    are generated while the player waits for the opponent or for user input, so a turn only has
+    to take a ready copy.
+    """
+    def __init__(self, graphs, size=DEFAULT_SIZE, low_watermark=DEFAULT_LOW_WATERMARK):
+        """
+        Creates a new CopyPool object. The thread must be started with start().
+        :param graphs: The list of graph objects.
+        :param size: The number of copies per graph, that the pool fills up.
+        :param low_watermark: The pool starts to refill a graph, if it has less copies than this value.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.graphs = list(graphs)
+        self.size = max(size, 1)
+        self.low_watermark = min(max(low_watermark, 1), self.size)
+        self.copies = [deque() for g in self.graphs]
+        self.refilling = [True for g in self.graphs]
+        self.cond = threading.Condition()
+        self.running = True
+
+        # Counts the copies taken from the pool and those that had to be created on demand.
+        self.hits = 0
+        self.misses = 0
+
+    def next_refill(self):
+        """
+        Returns the index of a graph that needs more copies. Must be invoked with self.cond held.
+        :return: The graph index or -1 if all graphs have enough copies.
+        """
+        for i in range(0, len(self.graphs)):
+            if self.refilling[i]:
+                if len(self.copies[i]) < self.size:
+                    return i
+                self.refilling[i] = False
+        return -1
+
+    def run(self):
+        """
+        Fills the pool until self.stop() is invoked.
+        """
+        while True:
+            with self.cond:
+                i = self.next_refill()
+                while self.running and i == -1:
+                    self.cond.wait()
+                    i = self.next_refill()
+                if not self.running:
+                    return
+
+            # The copy is created without holding the lock.
+            copy = self.graphs[i].isomorphic_copy()
+
+            with self.cond:
+                self.copies[i].append(copy)
+
+    def take(self, i):
+        """
+        Returns a prepared isomorphic copy of the graph at index i. If the pool is empty
+        for that graph, the copy is created immediately.
+        :param i: The index of the graph.
+        :return: The isomorphic graph, The isomorphism.
+        """
+        with self.cond:
+            copy = None
+            if len(self.copies[i]) > 0:
+                copy = self.copies[i].popleft()
+                self.hits += 1
+            else:
+                self.misses += 1
+
+            if len(self.copies[i]) < self.low_watermark:
+                self.refilling[i] = True
+                self.cond.notify()
+
+        if copy is None:
+            copy = self.graphs[i].isomorphic_copy()
+        return copy
+
+    def stop(self):
+        """
+        Stops the thread. Prepared copies are dropped.
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify()
@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import random, multiprocessing, Graphs, GraphInvariants
+
+#
+# The number of candidate graphs per batch, in addition to the requested number of graphs.
+# The candidates replace graphs that are isomorphic to another graph.
+#
+SPARE_CANDIDATES = 2
+
+#
+# The number of candidate graphs that GraphWorkers.generate creates at most.
+#
+MAX_CANDIDATES = GraphInvariants.MAX_REPLACEMENTS
+
+
+def generate_edges(task):
+    """
+    Creates the edge list of a random graph. This function runs in a worker process.
+    Each task has its own seed, so the graph does not depend on the worker that runs the task.
+    :param task: A tuple with the seed, the number of vertices, the degree and the engine.
+    :return: The seed and a list of tuples.
+    """
+    seed, vertices, degree, engine = task
+    rng = random.Random(seed)
+    return seed, Graphs.random_graph(vertices, degree, Graphs.Graph, engine, rng).edges
+
+
+class GraphWorkers:
+    """
+    This class represents a pool of processes that generate random graphs concurrently.
+    """
+    def __init__(self, processes=None):
+        """
+        Creates a new GraphWorkers object. The processes are started on the first request.
+        :param processes: The number of processes. The default is the number of CPU cores.
+        """
+        self.processes = processes
+        self.pool = None
+
+        # The seeds of the graphs of the last generate() call.
+        self.seeds = []
+
+    def get_pool(self):
+        """
+        Returns the process pool and starts it, if it is not running.
+        :return: The multiprocessing.Pool object.
+        """
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.processes)
+        return self.pool
+
+    def generate(self, certifier, num_graphs, vertices, degree, graph_type=Graphs.Graph,
+                 engine=Graphs.ENGINE_MATRIX, seed=None, speculative=0):
+        """
+        Generates random graphs that are pairwise not isomorphic, see GraphInvariants.Certifier.
+        The candidate graph k is created with the seed seed + k. Without speculation, the candidates
+        are accepted in the order of k, so the same seed always gives the same graphs.
+        With speculation, the given number of extra candidates is started at once and the graphs
+        that finish first are accepted. This cuts the waiting time for slow candidates, but the
+        result depends on the order in which the workers finish. self.seeds stores the seeds of
+        the accepted graphs in both modes.
+        :param certifier: The GraphInvariants.Certifier object.
+        :param num_graphs: The number of graphs.
+        :param vertices: The number of vertices of each graph.
+        :param degree: The degree of each vertex.
+        :param graph_type: The graph class to create, see Graphs.random_graph.
+        :param engine: The generator, see Graphs.random_graph.
+        :param seed: The base seed. A random seed is used, if it is None.
+        :param speculative: The number of extra candidates for the speculative mode. 0 disables the speculation.
+        :return: A list of graph objects or None, if no certified graphs are found within MAX_CANDIDATES candidates.
+        """
+        if seed is None:
+            seed = random.getrandbits(32)
+
+        pool = self.get_pool()
+        graphs = []
+        seeds = []
+        k = 0
+
+        while len(graphs) < num_graphs and k < MAX_CANDIDATES:
+            if speculative > 0:
+                batch = num_graphs - len(graphs) + speculative
+            else:
+                batch = num_graphs - len(graphs) + SPARE_CANDIDATES
+            batch = min(batch, MAX_CANDIDATES - k)
+
+            tasks = [(seed + i, vertices, degree, engine) for i in range(k, k + batch)]
+            k += batch
+
+            if speculative > 0:
+                results = pool.imap_unordered(generate_edges, tasks)
+            else:
+                results = pool.imap(generate_edges, tasks)
+
+            for s, edges in results:
+                g = graph_type(edges)
+                if certifier.find_collision(graphs + [g]) == -1:
+                    graphs.append(g)
+                    seeds.append(s)
+                    if len(graphs) == num_graphs:
+                        break
+
+            if speculative > 0 and len(graphs) == num_graphs:
+                # Drops the candidates that are still running.
+                self.close(terminate=True)
+
+        self.seeds = seeds
+
+        if len(graphs) < num_graphs:
+            return None
+        return graphs
+
+    def close(self, terminate=False):
+        """
+        Stops the worker processes. A new pool is started on the next request.
+        :param terminate: Whether running tasks are cancelled or not.
+        """
+        if self.pool is not None:
+            if terminate:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
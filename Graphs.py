@@ -14,7 +14,96 @@ THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRI
 THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
 TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
-import random
+import random, hashlib, sys
+from array import array
+from itertools import chain
+
+try:
+    import numpy
+except ImportError:
+    # The vectorized permutation functions fall back to pure python.
+    numpy = None
+
+#
+# Engine for random_graph. Builds a random adjacency matrix, needs O(V^2) time and memory.
+#
+ENGINE_MATRIX = 'matrix'
+
+#
+# Engine for random_graph. Pairs the vertex stubs randomly and repairs invalid pairs, needs O(V*d) time and memory.
+#
+ENGINE_PAIRING = 'pairing'
+
+#
+# The number of failed repair attempts per stub pair after that the pairing engine starts new.
+#
+PAIRING_MAX_RETRIES = 100
+
+#
+# The version of SeedRandom. It must be changed with each change of SeedRandom or of the random
+# graph engines, that changes the graphs of a seed.
+#
+SEED_RANDOM_VERSION = 1
+
+
+class SeedRandom:
+    """
+    This class represents a deterministic random number generator for random_graph. It implements the
+    splitmix64 generator and its own randint and shuffle, so the same seed creates the same graphs
+    on each platform and python version. The random module does not guarantee that.
+    """
+    MASK = (1 << 64) - 1
+
+    def __init__(self, seed):
+        """
+        Creates a new SeedRandom object.
+        :param seed: A non-negative integer.
+        """
+        self.state = seed & self.MASK
+
+    def next(self):
+        """
+        Returns the next random number.
+        :return: An integer in the range 0 to 2^64 - 1.
+        """
+        self.state = (self.state + 0x9E3779B97F4A7C15) & self.MASK
+        z = self.state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & self.MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & self.MASK
+        return z ^ (z >> 31)
+
+    def random(self):
+        """
+        Returns a random float in the range 0.0 to 1.0, without 1.0.
+        """
+        return (self.next() >> 11) * (1.0 / (1 << 53))
+
+    def randint(self, a, b):
+        """
+        Returns a random integer in the range a to b, including b. The numbers are equally distributed.
+        :param a: The lowest integer.
+        :param b: The highest integer.
+        :return: The random integer.
+        """
+        n = b - a + 1
+        if n <= 0:
+            raise ValueError('Empty range for randint')
+
+        # Rejects the highest numbers, so each remainder is equally likely.
+        limit = (1 << 64) - (1 << 64) % n
+        x = self.next()
+        while x >= limit:
+            x = self.next()
+        return a + int(x % n)
+
+    def shuffle(self, x):
+        """
+        Shuffles the given list in place with the Fisher-Yates algorithm.
+        :param x: The list.
+        """
+        for i in xrange(len(x) - 1, 0, -1):
+            j = self.randint(0, i)
+            x[i], x[j] = x[j], x[i]
 
 
 class Graph:
@@ -28,14 +117,95 @@ class Graph:
         """
         self.edges = []
 
+        # Set of normalized (min, max) tuples. It mirrors self.edges and allows
+        # constant time lookups for duplicates and edge queries.
+        self.edge_set = set()
+
+        # Cached adjacency index, see self.adjacency(). It is rebuilt if the number of edges changes.
+        self._adjacency = None
+        self._adjacency_size = 0
+
+        # Cached fingerprint, see self.fingerprint().
+        self._fingerprint = None
+
         for edge in edges:
-            skip = False
-            for e in self.edges:
-                if edge[0] in e and edge[1] in e:
-                    skip = True
+            self.add_edge(edge)
+
+    def __getstate__(self):
+        # Only the edges are pickled. The indexes are rebuilt by the receiver and
+        # a received fingerprint is never trusted.
+        return {'edges': self.edges}
 
-            if not skip:
-                self.edges.append(edge)
+    def __setstate__(self, state):
+        self.__init__(state['edges'])
+
+    def add_edge(self, edge):
+        """
+        Appends the given edge to self.edges, if there is no edge between the two vertices yet.
+        :param edge: A tuple with two vertices.
+        :return: Whether the edge was added or not.
+        """
+        key = normalize_edge(edge)
+        if key in self.edge_set:
+            return False
+
+        self.edge_set.add(key)
+        self.edges.append(edge)
+        self._adjacency = None
+        self._fingerprint = None
+        return True
+
+    def fingerprint(self):
+        """
+        Returns the canonical fingerprint of this graph, see graph_fingerprint. The fingerprint
+        is calculated once and cached until the edges change.
+        :return: The fingerprint string.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = graph_fingerprint(self.edges)
+        return self._fingerprint
+
+    def has_edge(self, u, v):
+        """
+        Checks if there is an edge between the vertices u and v.
+        :param u: The first vertex.
+        :param v: The second vertex.
+        :return: True, if the graph contains the edge.
+        """
+        return normalize_edge((u, v)) in self.edge_set
+
+    def adjacency(self):
+        """
+        Returns the adjacency index of this graph. The index is built with one pass over
+        self.edges on the first query and cached until the edges change.
+        :return: [0] A dict with a neighbor list for each vertex, [1] the list of vertices.
+        """
+        if self._adjacency is None or self._adjacency_size != len(self.edges):
+            neighbors = {}
+            vertices = []
+            for (u, v) in self.edges:
+                if u not in neighbors:
+                    neighbors[u] = []
+                    vertices.append(u)
+                if v not in neighbors:
+                    neighbors[v] = []
+                    vertices.append(v)
+                neighbors[u].append(v)
+                if u != v:
+                    neighbors[v].append(u)
+
+            self._adjacency = neighbors, vertices
+            self._adjacency_size = len(self.edges)
+
+        return self._adjacency
+
+    def neighbors(self, vertex):
+        """
+        Returns the neighbors of the given vertex.
+        :param vertex: The vertex to look up.
+        :return: A list of vertices, empty if the vertex is not included in an edge.
+        """
+        return self.adjacency()[0].get(vertex, [])
 
     def deg(self, vertex):
         """
@@ -44,42 +214,32 @@ class Graph:
         :param vertex: The vertex to calculate the degree.
         :return: The degree or 0.
         """
-        num = 0
-        for edge in self.edges:
-            if vertex in edge:
-                num += 1
-        return num
+        return len(self.neighbors(vertex))
 
     def vertices(self):
         """
         Returns a list of vertices.
         :return: The list of vertices.
         """
-        vertices = []
-        for edge in self.edges:
-            for vertex in edge:
-                if vertex not in vertices:
-                    vertices.append(vertex)
-        return vertices
+        return list(self.adjacency()[1])
 
     def max_deg(self):
         """
         Returns the highest degree in this graph.
-        :return: The highest degree in this graph.
+        :return: The highest degree in this graph or 0 if the graph has no edges.
         """
-        vertices = self.vertices()
-        max_d = self.deg(vertices[0])
-        for i in range(1, len(vertices)):
-            max_d = max(max_d, self.deg(vertices[0]))
+        neighbors = self.adjacency()[0]
+        max_d = 0
+        for n in neighbors.itervalues():
+            max_d = max(max_d, len(n))
         return max_d
 
     def num_vertices(self):
         """
-        Returns the number of vertices in this graph. This method invokes self.vertices() to
-        create a list of all vertices.
+        Returns the number of vertices in this graph.
         :return: The number of vertices in this graph.
         """
-        return len(self.vertices())
+        return len(self.adjacency()[1])
 
     def isomorphic_copy(self):
         """
@@ -88,11 +248,248 @@ class Graph:
         """
         L = list(range(self.num_vertices()))
         random.shuffle(L)
-        f = permut_function(L)
-        e = apply_isomorphism(self.edges, f)
+        e = apply_permutation(self.edges, L)
         return Graph(e), L
 
 
+class CompactGraph(object):
+    """
+    This class represents the same kind of graph as Graph, but stores the edges in two
+    unsigned int arrays instead of a list of tuples. The adjacency index is a CSR pair of
+    arrays (offsets and neighbors), built on the first query.
+    """
+    __slots__ = ('heads', 'tails', '_offsets', '_neighbors', '_num_vertices', '_fingerprint')
+
+    def __init__(self, edges=()):
+        """
+        Creates a new CompactGraph object. This method skips multiple edges between two vertices.
+        :param edges: A list of tuples.
+        """
+        self.heads = array('I')
+        self.tails = array('I')
+        self._offsets = None
+        self._neighbors = None
+        self._num_vertices = 0
+        self._fingerprint = None
+
+        seen = set()
+        for edge in edges:
+            key = normalize_edge(edge)
+            if key not in seen:
+                seen.add(key)
+                self.heads.append(edge[0])
+                self.tails.append(edge[1])
+
+    @classmethod
+    def from_arrays(cls, heads, tails):
+        """
+        Creates a new CompactGraph object from the given endpoint arrays. The arrays are used as
+        they are, so they must not contain multiple edges.
+        :param heads: An array('I') with the first vertex of each edge.
+        :param tails: An array('I') with the second vertex of each edge.
+        :return: The graph object.
+        """
+        g = cls()
+        g.heads = heads
+        g.tails = tails
+        return g
+
+    @classmethod
+    def from_graph(cls, g):
+        """
+        Converts the given Graph object into a CompactGraph object.
+        :param g: The graph to convert.
+        :return: The compact graph object.
+        """
+        return cls.from_arrays(array('I', [e[0] for e in g.edges]), array('I', [e[1] for e in g.edges]))
+
+    def to_graph(self):
+        """
+        Converts self into a Graph object with an edge list.
+        :return: The graph object.
+        """
+        return Graph(self.edges)
+
+    def __getstate__(self):
+        return self.heads, self.tails
+
+    def __setstate__(self, state):
+        self.heads, self.tails = state
+        self._offsets = None
+        self._neighbors = None
+        self._num_vertices = 0
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.heads)
+
+    def __iter__(self):
+        return iter(zip(self.heads, self.tails))
+
+    @property
+    def edges(self):
+        """
+        Returns the edges as list of tuples, in the same order as they were added.
+        :return: A list of tuples.
+        """
+        return zip(self.heads, self.tails)
+
+    def fingerprint(self):
+        """
+        Returns the canonical fingerprint of this graph, see graph_fingerprint. The fingerprint
+        is calculated once and cached.
+        :return: The fingerprint string.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = graph_fingerprint(self)
+        return self._fingerprint
+
+    def adjacency(self):
+        """
+        Returns the CSR adjacency index of this graph. The neighbors of vertex v are
+        stored in neighbors[offsets[v]:offsets[v + 1]].
+        :return: [0] The offsets array, [1] the neighbors array.
+        """
+        if self._offsets is None:
+            size = 1
+            if len(self.heads) > 0:
+                size = max(max(self.heads), max(self.tails)) + 1
+
+            # Counts the degree of each vertex
+            offsets = array('I', [0]) * (size + 1)
+            for u, v in zip(self.heads, self.tails):
+                offsets[u + 1] += 1
+                if u != v:
+                    offsets[v + 1] += 1
+
+            num_vertices = 0
+            for i in range(1, size + 1):
+                if offsets[i] > 0:
+                    num_vertices += 1
+                offsets[i] += offsets[i - 1]
+
+            # Fills the neighbors of each vertex
+            neighbors = array('I', [0]) * offsets[size]
+            pos = array('I', offsets)
+            for u, v in zip(self.heads, self.tails):
+                neighbors[pos[u]] = v
+                pos[u] += 1
+                if u != v:
+                    neighbors[pos[v]] = u
+                    pos[v] += 1
+
+            self._offsets = offsets
+            self._neighbors = neighbors
+            self._num_vertices = num_vertices
+
+        return self._offsets, self._neighbors
+
+    def neighbors(self, vertex):
+        """
+        Returns the neighbors of the given vertex.
+        :param vertex: The vertex to look up.
+        :return: An array of vertices, empty if the vertex is not included in an edge.
+        """
+        offsets, neighbors = self.adjacency()
+        if 0 <= vertex < len(offsets) - 1:
+            return neighbors[offsets[vertex]:offsets[vertex + 1]]
+        return array('I')
+
+    def has_edge(self, u, v):
+        """
+        Checks if there is an edge between the vertices u and v.
+        :param u: The first vertex.
+        :param v: The second vertex.
+        :return: True, if the graph contains the edge.
+        """
+        return v in self.neighbors(u)
+
+    def deg(self, vertex):
+        """
+        Calculates the degree of the given vertex. This method returns 0 if the given vertex is not
+        included in an edge.
+        :param vertex: The vertex to calculate the degree.
+        :return: The degree or 0.
+        """
+        offsets = self.adjacency()[0]
+        if 0 <= vertex < len(offsets) - 1:
+            return offsets[vertex + 1] - offsets[vertex]
+        return 0
+
+    def vertices(self):
+        """
+        Returns a list of vertices in ascending order.
+        :return: The list of vertices.
+        """
+        offsets = self.adjacency()[0]
+        return [v for v in range(0, len(offsets) - 1) if offsets[v + 1] > offsets[v]]
+
+    def max_deg(self):
+        """
+        Returns the highest degree in this graph.
+        :return: The highest degree in this graph or 0 if the graph has no edges.
+        """
+        offsets = self.adjacency()[0]
+        max_d = 0
+        for v in range(0, len(offsets) - 1):
+            max_d = max(max_d, offsets[v + 1] - offsets[v])
+        return max_d
+
+    def num_vertices(self):
+        """
+        Returns the number of vertices in this graph.
+        :return: The number of vertices in this graph.
+        """
+        self.adjacency()
+        return self._num_vertices
+
+    def isomorphic_copy(self):
+        """
+        Creates a random graph, that is isomorphic to self.
+        :return: The isomorphic graph, The isomorphism.
+        """
+        L = list(range(self.num_vertices()))
+        random.shuffle(L)
+        heads, tails = permute_arrays(self.heads, self.tails, L)
+        return CompactGraph.from_arrays(heads, tails), L
+
+
+def normalize_edge(edge):
+    """
+    Returns the given edge as tuple with the lower vertex first. Two edges between the same
+    vertices are equal after the normalization.
+    :param edge: A tuple with two vertices.
+    :return: The normalized tuple.
+    """
+    u, v = edge[0], edge[1]
+    if v < u:
+        return v, u
+    return u, v
+
+
+def graph_fingerprint(edges):
+    """
+    Calculates a fingerprint that does not depend on the order and orientation of the edges.
+    The fingerprint is the SHA-1 hash of the sorted, normalized edge list, packed as
+    little-endian unsigned ints. Equal fingerprints mean equal edge sets, not isomorphic graphs.
+    :param edges: A list of tuples or a CompactGraph object.
+    :return: The hex digest string.
+    """
+    flat = array('I', chain.from_iterable(sorted(normalize_edge(e) for e in edges)))
+    if sys.byteorder == 'big':
+        flat.byteswap()
+    return hashlib.sha1(flat.tostring()).hexdigest()
+
+
+def graphs_digest(graphs):
+    """
+    Calculates a digest of the edge sets of the given graphs in their order.
+    :param graphs: A list of graph objects.
+    :return: The hex digest string.
+    """
+    return hashlib.sha1(''.join(g.fingerprint() for g in graphs)).hexdigest()
+
+
 def permut_function(L):
     """
     The lambda function returns the isomorphic vertex value for the given vertex.
@@ -108,20 +505,113 @@ def inv_permut_function(L):
     :param L: The isomorphism list.
     :return: A function to inverse an isomorphism.
     """
-    return lambda i: 1 + L.index(i - 1)
+    inv = inverse_permutation(L)
+    return lambda i: int(inv[i - 1]) + 1
+
+
+def inverse_permutation(L):
+    """
+    Creates the inverse of the given isomorphism list with a single pass, so that
+    inv[L[i]] == i for each index i.
+    :param L: The isomorphism list.
+    :return: The inverse isomorphism list, a numpy array if numpy is available.
+    """
+    if numpy is not None:
+        P = numpy.asarray(L, dtype=numpy.int64)
+        inv = numpy.empty(len(P), dtype=numpy.int64)
+        inv[P] = numpy.arange(len(P), dtype=numpy.int64)
+        return inv
+
+    inv = [0] * len(L)
+    for i, x in enumerate(L):
+        inv[x] = i
+    return inv
+
+
+def check_vertices(n, *columns):
+    """
+    Checks, that all given vertices are in the range 1 to n, so an isomorphism list of length n can map them.
+    :param n: The length of the isomorphism list.
+    :param columns: Sequences of vertices.
+    :raise ValueError: If a vertex is out of range.
+    """
+    for column in columns:
+        if len(column) > 0 and (min(column) < 1 or max(column) > n):
+            raise ValueError('The vertices do not match the isomorphism of ' + str(n) + ' vertices')
+
+
+def apply_permutation(G, L):
+    """
+    Applies the given isomorphism list to the given graph. Vertex v is mapped to L[v - 1] + 1, the same as
+    apply_isomorphism(G, permut_function(L)). The whole edge array is remapped at once if numpy is available.
+    :param G: Graph to apply the isomorphism. This can be an edge list, a Graph or a CompactGraph object.
+    :param L: The isomorphism list.
+    :return: A list of isomorphic tuples.
+    :raise ValueError: If a vertex of the graph is not in the range 1 to len(L).
+    """
+    if isinstance(G, CompactGraph):
+        heads, tails = permute_arrays(G.heads, G.tails, L)
+        return zip(heads, tails)
+    if isinstance(G, Graph):
+        G = G.edges
+
+    if numpy is not None and len(G) > 0:
+        P = numpy.asarray(L, dtype=numpy.int64)
+        E = numpy.fromiter(chain.from_iterable(G), dtype=numpy.int64, count=2 * len(G)).reshape(-1, 2)
+        if E.min() < 1 or E.max() > len(P):
+            raise ValueError('The vertices do not match the isomorphism of ' + str(len(P)) + ' vertices')
+        E = P[E - 1] + 1
+        return zip(E[:, 0].tolist(), E[:, 1].tolist())
+
+    check_vertices(len(L), list(chain.from_iterable(G)))
+    return [(L[i - 1] + 1, L[j - 1] + 1) for (i, j) in G]
+
+
+def apply_inverse_permutation(G, L):
+    """
+    Applies the inverse of the given isomorphism list to the given graph. The inverse is built once,
+    see inverse_permutation.
+    :param G: Graph to apply the inverse isomorphism. This can be an edge list, a Graph or a CompactGraph object.
+    :param L: The isomorphism list.
+    :return: A list of tuples.
+    :raise ValueError: If a vertex of the graph is not in the range 1 to len(L).
+    """
+    return apply_permutation(G, inverse_permutation(L))
+
+
+def permute_arrays(heads, tails, L):
+    """
+    Applies the given isomorphism list to the endpoint arrays of a CompactGraph.
+    :param heads: An array('I') with the first vertex of each edge.
+    :param tails: An array('I') with the second vertex of each edge.
+    :param L: The isomorphism list.
+    :return: The two permuted arrays.
+    :raise ValueError: If a vertex is not in the range 1 to len(L).
+    """
+    check_vertices(len(L), heads, tails)
+    if numpy is not None and len(heads) > 0:
+        P = numpy.asarray(L, dtype=numpy.int64)
+        dtype = numpy.dtype('=u' + str(heads.itemsize))
+        mapped = []
+        for column in (heads, tails):
+            E = P[numpy.frombuffer(column, dtype=dtype).astype(numpy.int64) - 1] + 1
+            mapped.append(array('I', E.astype(dtype).tostring()))
+        return mapped[0], mapped[1]
+
+    return array('I', [L[i - 1] + 1 for i in heads]), array('I', [L[i - 1] + 1 for i in tails])
 
 
 def apply_isomorphism(G, f):
     """
     Creates a function to apply the given isomorphism f to the given graph G.
-    :param G: Graph to apply the isomorphism.
+    :param G: Graph to apply the isomorphism. This can be an edge list or a CompactGraph object.
     :param f: The isomorphism function.
     :return: A list of isomorphic tuples.
     """
     return [(f(i), f(j)) for (i, j) in G]
 
 
-def random_adjacency_mat(vertices, degree):
+def random_adjacency_mat(vertices, degree, rng=random):
     """
     Creates a random adjacency matrix. The algorithm creates a valid square matrix
     where each vertex has the given degree. The edges were built randomly. It is
@@ -129,6 +619,7 @@ def random_adjacency_mat(vertices, degree):
     aborts the matrix and starts new.
     :param vertices: The number of vertices.
     :param degree: The degree for each vertex.
+    :param rng: The random number generator, the random module or a random.Random object.
     :return: A random adjacency matrix.
     """
     M = None
@@ -191,7 +682,7 @@ def random_adjacency_mat(vertices, degree):
                 if len(possible_indexes) > 0:
 
                     # Chooses a random vertex to build a new edge
-                    index = random.randint(0, len(possible_indexes) - 1)
+                    index = rng.randint(0, len(possible_indexes) - 1)
                     vertex = possible_indexes.pop(index)
 
                     # Sets the edge in the upper and lower triangular matrix
@@ -246,16 +737,89 @@ def edges_from_adjacency_mat(M):
     return edges
 
 
-def random_graph(vertices, degree):
+def random_regular_edges(vertices, degree, rng=random):
+    """
+    Creates the edge list of a random graph where each vertex has the given degree. This function
+    uses the pairing (configuration) model: each vertex gets degree stubs, the stubs are shuffled
+    and paired. Pairs that would build a loop or a multiple edge are repaired by swapping them
+    with a random valid edge. If a pair can not be repaired, the algorithm starts new. Graphs with
+    a degree higher than half of the vertices are built as complement of a sparse random graph.
+    :param vertices: The number of vertices.
+    :param degree: The degree for each vertex.
+    :param rng: The random number generator, the random module or a random.Random object.
+    :return: A list with tuples.
+    """
+    if degree < 0 or degree >= max(vertices, 1) or (vertices * degree) % 2 != 0:
+        raise ValueError('There is no simple graph with '+str(vertices)+' vertices of degree '+str(degree))
+
+    if 2 * degree > vertices - 1:
+        # Dense graphs are built as complement of a sparse graph, because random pairs collide too often.
+        edge_set = set(random_regular_edges(vertices, vertices - 1 - degree, rng))
+        return [(u, v) for u in range(1, vertices + 1) for v in range(u + 1, vertices + 1)
+                if (u, v) not in edge_set]
+
+    while True:
+        # Each vertex appears degree times in the stub list.
+        stubs = [v for v in range(1, vertices + 1) for d in range(0, degree)]
+        rng.shuffle(stubs)
+
+        edges = []
+        edge_set = set()
+        invalid = []
+
+        # Pairs two neighboring stubs to an edge.
+        for k in range(0, len(stubs), 2):
+            edge = normalize_edge((stubs[k], stubs[k + 1]))
+            if edge[0] == edge[1] or edge in edge_set:
+                invalid.append(edge)
+            else:
+                edge_set.add(edge)
+                edges.append(edge)
+
+        # Repairs the invalid pairs (u, v). A random edge (x, y) is replaced with the edges (u, x) and (v, y).
+        retries = 0
+        while len(invalid) > 0 and len(edges) > 0 and retries < PAIRING_MAX_RETRIES:
+            u, v = invalid[-1]
+            i = rng.randint(0, len(edges) - 1)
+            x, y = edges[i]
+            if rng.randint(0, 1) == 1:
+                x, y = y, x
+
+            e1 = normalize_edge((u, x))
+            e2 = normalize_edge((v, y))
+            if u != x and v != y and e1 != e2 and e1 not in edge_set and e2 not in edge_set:
+                edge_set.remove(edges[i])
+                edge_set.add(e1)
+                edge_set.add(e2)
+                edges[i] = e1
+                edges.append(e2)
+                invalid.pop()
+                retries = 0
+            else:
+                retries += 1
+
+        if len(invalid) == 0:
+            return edges
+
+
+def random_graph(vertices, degree, graph_type=Graph, engine=ENGINE_MATRIX, rng=random):
     """
     Creates a random graph. Each vertex of the graph has the same degree.
     The resulted graph is simple, undirected and unweighted.
     :param vertices: The number of vertices.
     :param degree: The degree for each vertex.
+    :param graph_type: The graph class to create, Graph or CompactGraph.
+    :param engine: The generator, ENGINE_MATRIX or ENGINE_PAIRING.
+    :param rng: The random number generator, the random module or a random.Random object.
     :return: A random created graph.
+    :raise ValueError: If the engine is unknown.
     """
-    M = random_adjacency_mat(vertices, degree)
-    edges = edges_from_adjacency_mat(M)
+    if engine == ENGINE_PAIRING:
+        edges = random_regular_edges(vertices, degree, rng)
+    elif engine == ENGINE_MATRIX:
+        M = random_adjacency_mat(vertices, degree, rng)
+        edges = edges_from_adjacency_mat(M)
+    else:
+        raise ValueError('Unknown graph engine ' + repr(engine))
     #print ('The resulted graph has '+str(vertices)+' vertices and '+str(len(edges))+' edges.')
-    return Graph(edges)
-
+    return graph_type(edges)
@@ -52,5 +52,8 @@ def launch():
     while Game.play_again(player):
         playing(player)
 
+    player.close()
 
-launch()
\ No newline at end of file
+
+if __name__ == '__main__':
+    launch()
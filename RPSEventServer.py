@@ -0,0 +1,868 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import socket, select, errno, collections, types, sys, os, traceback, argparse, heapq, time, threading
+import _multiprocessing
+import RPSNetwork
+
+#
+# Event bits of the poller. The values are the same for epoll, poll and select.
+#
+READ = 0x001
+WRITE = 0x004
+
+#
+# Operations of the event loop. (WAIT_READ, sock) and (WAIT_WRITE, sock) suspend a coroutine,
+# until the socket is readable or writable. (WAIT_READ_ANY, socks) suspends it, until one of the
+# sockets is readable. (WAIT_TIME, seconds) suspends it for the given time.
+#
+WAIT_READ = 'wait_read'
+WAIT_READ_ANY = 'wait_read_any'
+WAIT_WRITE = 'wait_write'
+WAIT_TIME = 'wait_time'
+
+#
+# The maximal time in seconds, that the event loop waits for events. A stopped loop ends after this time.
+#
+POLL_TIMEOUT = 1.0
+
+#
+# The initial size of the receive buffer of each connection. It holds a whole chunk, but it is smaller
+# than RPSNetwork.RECV_BUFFER_SIZE, because thousands of connections are open at once.
+#
+BUFFER_SIZE = RPSNetwork.CHUNK_SIZE + 4
+
+#
+# The time in seconds, that a player waits alone in the lobby of a worker, before it is handed to
+# the lobby of another worker, see RPSEventServer.handoff.
+#
+HANDOFF_DELAY = 0.5
+
+#
+# The error numbers of a non-blocking socket, that is not ready.
+#
+WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+class Poller:
+    """
+    This class waits for socket events with epoll, poll or select, whatever is available.
+    """
+    def __init__(self):
+        """
+        Creates a new Poller object.
+        """
+        self.impl = None
+        self.scale = 1
+        if hasattr(select, 'epoll'):
+            self.impl = select.epoll()
+        elif hasattr(select, 'poll'):
+            # poll expects the timeout in milliseconds.
+            self.impl = select.poll()
+            self.scale = 1000
+
+        # The registered events of each file descriptor, if select is used.
+        self.fds = {}
+
+    def register(self, fd, events):
+        """
+        Starts watching a file descriptor.
+        :param fd: The file descriptor.
+        :param events: READ or WRITE.
+        """
+        if self.impl is not None:
+            self.impl.register(fd, events)
+        else:
+            self.fds[fd] = events
+
+    def unregister(self, fd):
+        """
+        Stops watching a file descriptor.
+        :param fd: The file descriptor.
+        """
+        if self.impl is not None:
+            self.impl.unregister(fd)
+        else:
+            del self.fds[fd]
+
+    def poll(self, timeout):
+        """
+        Waits for events of the registered file descriptors.
+        :param timeout: The maximal time to wait in seconds.
+        :return: A list of (fd, events) tuples.
+        """
+        if self.impl is not None:
+            try:
+                return self.impl.poll(timeout * self.scale)
+            except (IOError, select.error), e:
+                if e.args[0] == errno.EINTR:
+                    return []
+                raise
+
+        r = [fd for fd, events in self.fds.items() if events & READ]
+        w = [fd for fd, events in self.fds.items() if events & WRITE]
+        r, w, x = select.select(r, w, r + w, timeout)
+        return [(fd, READ) for fd in r + x] + [(fd, WRITE) for fd in w]
+
+
+class Task:
+    """
+    This class represents a coroutine, that is run by an EventLoop. The stack contains the generators,
+    that were yielded by the coroutine and are not finished yet.
+    """
+    def __init__(self, coroutine):
+        """
+        Creates a new Task object.
+        :param coroutine: A generator, that yields OP_ operations and WAIT_ operations.
+        """
+        self.stack = [coroutine]
+
+        # The file descriptors, that the task waits for.
+        self.fds = []
+
+
+class EventLoop:
+    """
+    This class runs coroutines with non-blocking sockets in one thread. A coroutine is a generator
+    like the protocol steps of RPSNetwork. It yields the OP_ operations of RPSNetwork, other generators
+    and the WAIT_ operations of this module.
+    """
+    def __init__(self):
+        """
+        Creates a new EventLoop object.
+        """
+        self.poller = Poller()
+        self.running = False
+
+        # The tasks, that can continue, with the value to send to them.
+        self.ready = collections.deque()
+
+        # The task, that waits for each file descriptor.
+        self.waiting = {}
+
+        # A heap of (time, number, task) tuples for the tasks, that wait until the time.
+        self.timers = []
+        self.timer_count = 0
+
+    def spawn(self, coroutine):
+        """
+        Adds a coroutine to the loop. It starts with the next iteration of the loop.
+        :param coroutine: A generator.
+        """
+        self.ready.append((Task(coroutine), None))
+
+    def run(self):
+        """
+        Runs the loop, until it is stopped or no coroutine is left.
+        """
+        self.running = True
+        while self.running and (self.ready or self.waiting or self.timers):
+            while self.ready:
+                task, value = self.ready.popleft()
+                self.resume(task, value)
+
+            if not self.waiting and not self.timers:
+                continue
+
+            timeout = POLL_TIMEOUT
+            if self.timers:
+                timeout = min(timeout, max(0.0, self.timers[0][0] - time.time()))
+
+            for fd, events in self.poller.poll(timeout):
+                task = self.waiting.get(fd)
+                if task is not None:
+                    # The task stops waiting for all its file descriptors.
+                    for task_fd in task.fds:
+                        del self.waiting[task_fd]
+                        self.poller.unregister(task_fd)
+                    task.fds = []
+                    self.ready.append((task, None))
+
+            now = time.time()
+            while self.timers and self.timers[0][0] <= now:
+                self.ready.append((heapq.heappop(self.timers)[2], None))
+        self.running = False
+
+    def stop(self):
+        """
+        Stops the loop. The loop ends after the current iteration.
+        """
+        self.running = False
+
+    def close(self):
+        """
+        Closes the generators of all remaining tasks, so their finally blocks are run. The loop must
+        not be running.
+        """
+        tasks = [task for task, value in self.ready] + [t[2] for t in self.timers]
+        tasks += set(self.waiting.values())
+        self.ready.clear()
+        self.timers = []
+        for fd in self.waiting.keys():
+            self.poller.unregister(fd)
+        self.waiting.clear()
+
+        for task in tasks:
+            while task.stack:
+                try:
+                    task.stack.pop().close()
+                except Exception:
+                    traceback.print_exc()
+
+    def resume(self, task, value):
+        """
+        Continues a task, until it waits for a socket or ends. An exception of a generator is thrown
+        into the generator, that yielded it. An exception of the coroutine itself is printed.
+        :param task: The Task object.
+        :param value: The value to send to the current generator of the task.
+        """
+        error = None
+        while task.stack:
+            gen = task.stack[-1]
+            try:
+                if error is not None:
+                    exc, error = error, None
+                    op = gen.throw(*exc)
+                else:
+                    op = gen.send(value)
+            except StopIteration:
+                task.stack.pop()
+                value = None
+                continue
+            except Exception:
+                error = sys.exc_info()
+                task.stack.pop()
+                continue
+
+            value = None
+            if isinstance(op, types.GeneratorType):
+                task.stack.append(op)
+            elif op[0] == RPSNetwork.OP_RESULT:
+                gen.close()
+                task.stack.pop()
+                value = op[1]
+            elif op[0] == RPSNetwork.OP_RECV:
+                task.stack.append(recv_msg(op[1]))
+            elif op[0] == RPSNetwork.OP_RECV_ANY:
+                task.stack.append(recv_any(op[1]))
+            elif op[0] == RPSNetwork.OP_SEND:
+                task.stack.append(send_msg(op[1], op[2]))
+            elif op[0] == RPSNetwork.OP_RELAY:
+                task.stack.append(relay_msg(*op[1:]))
+            elif op[0] == RPSNetwork.OP_SEND_FRAMES:
+                task.stack.append(send_frames(op[1], op[2]))
+            elif op[0] == WAIT_READ:
+                self.wait(task, [op[1]], READ)
+                return
+            elif op[0] == WAIT_READ_ANY:
+                self.wait(task, op[1], READ)
+                return
+            elif op[0] == WAIT_WRITE:
+                self.wait(task, [op[1]], WRITE)
+                return
+            elif op[0] == WAIT_TIME:
+                self.timer_count += 1
+                heapq.heappush(self.timers, (time.time() + op[1], self.timer_count, task))
+                return
+            else:
+                error = (ValueError, ValueError('Unknown operation ' + str(op[0])), None)
+
+        if error is not None:
+            traceback.print_exception(*error)
+
+    def wait(self, task, socks, events):
+        """
+        Suspends a task, until one of the sockets is ready.
+        :param task: The Task object.
+        :param socks: A list of socket objects.
+        :param events: READ or WRITE.
+        """
+        task.fds = [sock.fileno() for sock in socks]
+        for fd in task.fds:
+            self.waiting[fd] = task
+            self.poller.register(fd, events)
+
+
+#
+# Coroutines for non-blocking sockets. They correspond to the functions of RPSNetwork with the same name.
+#
+def read_frame(sock):
+    """
+    Receives a frame from the given socket without decompressing it.
+    :param sock: Non-blocking socket object to receive.
+    :return: A tuple with the flags and the payload or None, if the connection is closed.
+    """
+    buf = RPSNetwork.get_buffer(sock, BUFFER_SIZE)
+    while not buf.has_frame():
+        buf.reserve(buf.needed())
+        try:
+            if not buf.fill(sock):
+                yield RPSNetwork.OP_RESULT, None
+                return
+        except socket.error, e:
+            if e.args[0] not in WOULD_BLOCK:
+                yield RPSNetwork.OP_RESULT, None
+                return
+            yield WAIT_READ, sock
+
+    yield RPSNetwork.OP_RESULT, buf.read_frame(sock)
+
+
+def recv_msg(sock):
+    """
+    Receives a message from the given socket. Compressed messages are decompressed and chunks are joined.
+    :param sock: Non-blocking socket object to receive.
+    :return: The message or None, if the connection is closed.
+    """
+    parts = []
+    more = True
+    while more:
+        frame = yield read_frame(sock)
+        if frame is None:
+            yield RPSNetwork.OP_RESULT, None
+            return
+        parts.append(RPSNetwork.decompress(frame[0], frame[1]))
+        more = frame[0] & RPSNetwork.FLAG_MORE
+
+    yield RPSNetwork.OP_RESULT, ''.join(parts)
+
+
+def recv_any(socks):
+    """
+    Receives the next message of the socket, whose message arrives first.
+    :param socks: A list of non-blocking socket objects.
+    :return: A tuple with the socket and the message or None, if the connection is closed.
+    """
+    while True:
+        received = False
+        for sock in socks:
+            buf = RPSNetwork.get_buffer(sock, BUFFER_SIZE)
+            if buf.has_frame():
+                yield RPSNetwork.OP_RESULT, (sock, (yield recv_msg(sock)))
+                return
+
+            buf.reserve(buf.needed())
+            try:
+                if not buf.fill(sock):
+                    yield RPSNetwork.OP_RESULT, (sock, None)
+                    return
+                received = True
+            except socket.error, e:
+                if e.args[0] not in WOULD_BLOCK:
+                    yield RPSNetwork.OP_RESULT, (sock, None)
+                    return
+
+        if not received:
+            yield WAIT_READ_ANY, socks
+
+
+def write(sock, data):
+    """
+    Writes all bytes to the given socket.
+    :param sock: Non-blocking socket object to send.
+    :param data: String or memoryview.
+    """
+    view = memoryview(data)
+    pos = 0
+    while pos < len(view):
+        try:
+            pos += sock.send(view[pos:])
+        except socket.error, e:
+            if e.args[0] not in WOULD_BLOCK:
+                raise
+            yield WAIT_WRITE, sock
+
+
+def send_frame(sock, flags, payload):
+    """
+    Sends a frame with the given flags and payload.
+    :param sock: Non-blocking socket object to send.
+    :param flags: The FLAG_ bits of the frame.
+    :param payload: String payload.
+    """
+    header = RPSNetwork.frame_header(flags, payload)
+    if len(payload) <= RPSNetwork.SEND_COPY_LIMIT:
+        yield write(sock, header + RPSNetwork.to_string(payload))
+    else:
+        yield write(sock, header)
+        yield write(sock, payload)
+
+
+def send_msg(sock, msg):
+    """
+    Sends the given message uncompressed.
+    :param sock: Non-blocking socket object to send.
+    :param msg: String message.
+    """
+    for flags, payload in RPSNetwork.iter_frames(msg):
+        yield send_frame(sock, flags, payload)
+
+
+def send_frames(sock, frames):
+    """
+    Sends the given frames unchanged.
+    :param sock: Non-blocking socket object to send.
+    :param frames: A list of (flags, payload) tuples.
+    """
+    for flags, payload in frames:
+        yield send_frame(sock, flags, payload)
+
+
+def relay_msg(src, dst, frames=None):
+    """
+    Receives a message from src and sends it unchanged to dst, chunk by chunk.
+    :param src: Non-blocking socket object to receive.
+    :param dst: Non-blocking socket object to send.
+    :param frames: A list, that a copy of each frame is appended to, or None.
+    :return: Whether the whole message was relayed or not.
+    """
+    while True:
+        frame = yield read_frame(src)
+        if frame is None:
+            yield RPSNetwork.OP_RESULT, False
+            return
+        if frames is not None:
+            frames.append((frame[0], RPSNetwork.to_string(frame[1])))
+        yield send_frame(dst, frame[0], frame[1])
+        if not frame[0] & RPSNetwork.FLAG_MORE:
+            yield RPSNetwork.OP_RESULT, True
+            return
+
+
+class RPSEventServer:
+    """
+    This class represents a server, that runs all games and the udp discovery in one EventLoop.
+    The games use the same lobby, the same protocol steps and the same wire protocol as RPSServer.
+    """
+
+    def __init__(self, max_games=0, reuse_port=False):
+        """
+        Creates a new RPSEventServer object.
+        :param max_games: The maximal number of running games or 0 for no limit.
+        :param reuse_port: Whether other processes can listen on the same tcp port or not.
+        """
+        self.running = False
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock_udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.loop = EventLoop()
+        self.lobby = RPSNetwork.Lobby(max_games)
+        self.graphs = RPSNetwork.GraphCache()
+        self.reuse_port = reuse_port
+
+        # Is set, when the sockets are listening or the start has failed, see wait_ready.
+        self.ready = threading.Event()
+
+        # The thread of start_background or None.
+        self.thread = None
+
+        # Unix datagram sockets to pass players between the servers of several processes. A player,
+        # that waits alone, is sent with self.handoff. The players of self.receivers join this lobby.
+        self.handoff = None
+        self.receivers = []
+
+    def start(self, tcp_port, udp_port):
+        """
+        Starts listening on udp and tcp sockets and runs the event loop. This function returns, when
+        the server is stopped.
+        :param tcp_port: The port to listen with the tcp socket.
+        :param udp_port: The port to listen with the udp socket or None to answer no discovery requests.
+        """
+        bound = self.bind(tcp_port, udp_port)
+        self.ready.set()
+        if bound:
+            self.run()
+
+    def start_background(self, tcp_port, udp_port):
+        """
+        Starts the server in a new daemon thread. Use wait_ready to wait until the server is listening.
+        :param tcp_port: The port to listen with the tcp socket.
+        :param udp_port: The port to listen with the udp socket or None.
+        """
+        self.thread = threading.Thread(target=self.start, args=(tcp_port, udp_port))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wait_ready(self, timeout=None):
+        """
+        Waits until the sockets are listening or the start has failed.
+        :param timeout: The maximal time to wait in seconds or None to wait without limit.
+        :return: Whether the server is listening or not.
+        """
+        self.ready.wait(timeout)
+        return self.ready.is_set() and self.running
+
+    def bind(self, tcp_port, udp_port):
+        """
+        Binds the udp and tcp sockets and starts listening.
+        :param tcp_port: The port to listen with the tcp socket.
+        :param udp_port: The port to listen with the udp socket or None to answer no discovery requests.
+        :return: Whether both sockets are bound or not.
+        """
+        self.running = True
+
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.sock.bind(('', tcp_port))
+            self.sock.listen(RPSNetwork.LISTEN_BACKLOG)
+            self.sock.setblocking(0)
+            RPSNetwork.out('Server listen on port '+str(tcp_port)+'/tcp')
+
+            if udp_port is None:
+                self.sock_udp.close()
+                self.sock_udp = None
+            else:
+                self.sock_udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RPSNetwork.UDP_BUFFER_SIZE)
+                self.sock_udp.bind(('', udp_port))
+                self.sock_udp.setblocking(0)
+                RPSNetwork.out('Server listen on port '+str(udp_port)+'/udp')
+
+        except socket.error, msg:
+            self.sock.close()
+            self.sock = None
+            self.running = False
+            print 'Bind failed. Error Code : ' + str(msg[0]) + ' Message ' + msg[1]
+
+        return self.sock is not None
+
+    def run(self):
+        """
+        Runs the event loop with the bound sockets, until the server is stopped.
+        """
+        self.running = True
+        self.loop.spawn(self.accept_connections())
+        if self.sock_udp is not None:
+            self.loop.spawn(self.udp_listener())
+        for receiver in self.receivers:
+            self.loop.spawn(self.receive_players(receiver))
+        self.loop.run()
+        self.running = False
+
+        # Closes the connections of the interrupted games and of the waiting players.
+        self.loop.close()
+        for player in self.lobby.clear():
+            player.sock.close()
+        self.sock.close()
+        if self.sock_udp is not None:
+            self.sock_udp.close()
+
+    def stop(self):
+        """
+        Stops the event loop within RPSEventServer.POLL_TIMEOUT. Running games are interrupted and
+        all connections are closed.
+        """
+        self.running = False
+        self.loop.stop()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def udp_listener(self):
+        """
+        Coroutine, that answers all discovery requests, that are waiting on the udp socket.
+        """
+        while True:
+            yield WAIT_READ, self.sock_udp
+            while True:
+                try:
+                    m = self.sock_udp.recvfrom(1024)
+                except socket.error, e:
+                    if e.args[0] not in WOULD_BLOCK:
+                        RPSNetwork.out('Discovery failed: ' + str(e))
+                    break
+                RPSNetwork.answer_discovery(self.sock_udp, m[0], m[1])
+
+    def accept_connections(self):
+        """
+        Coroutine, that accepts all waiting connections. Each player joins the lobby in its own coroutine.
+        """
+        while True:
+            yield WAIT_READ, self.sock
+            while True:
+                try:
+                    conn, addr = self.sock.accept()
+                except socket.error, e:
+                    if e.args[0] not in WOULD_BLOCK:
+                        RPSNetwork.out('Accept failed: ' + str(e))
+                    break
+
+                conn.setblocking(0)
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                RPSNetwork.out('A player is connected')
+                self.loop.spawn(self.join(conn))
+
+    def join(self, sock):
+        """
+        Coroutine, that receives the name and the features of a player and adds it to the lobby.
+        :param sock: Non-blocking socket of the player.
+        """
+        player = yield RPSNetwork.hello(sock)
+        if player is None:
+            sock.close()
+            return
+
+        players = self.lobby.join(player)
+        self.start_game(players)
+        if players is None and self.handoff is not None:
+            yield WAIT_TIME, HANDOFF_DELAY
+            if self.lobby.take_lone(player):
+                self.hand_off(player)
+
+    def hand_off(self, player):
+        """
+        Sends a player with its name and features to the server of another process. The socket of
+        the player is passed as file descriptor.
+        :param player: The LobbyPlayer object.
+        """
+        RPSNetwork.out('Hand off ' + player.name)
+        try:
+            _multiprocessing.sendfd(self.handoff.fileno(), player.sock.fileno())
+            self.handoff.send(RPSNetwork.features_msg(player.features) + '\n' + player.name)
+        except (OSError, socket.error), e:
+            RPSNetwork.out('Hand off failed: ' + str(e))
+        player.sock.close()
+
+    def receive_players(self, receiver):
+        """
+        Coroutine, that receives the players, that are handed off by the servers of other processes,
+        and adds them to the lobby.
+        :param receiver: Non-blocking unix datagram socket.
+        """
+        while True:
+            yield WAIT_READ, receiver
+            try:
+                fd = _multiprocessing.recvfd(receiver.fileno())
+            except (OSError, RuntimeError):
+                # Nothing to receive or a name without socket, because the sender has crashed.
+                continue
+
+            sock = socket.fromfd(fd, socket.AF_INET, socket.SOCK_STREAM)
+            os.close(fd)
+            sock.setblocking(0)
+
+            # The name and the features are sent after the socket.
+            msg = None
+            while msg is None:
+                try:
+                    msg = receiver.recv(65536)
+                except socket.error, e:
+                    if e.args[0] not in WOULD_BLOCK:
+                        raise
+                    yield WAIT_READ, receiver
+
+            if '\n' not in msg:
+                sock.close()
+                continue
+            features, name = msg.split('\n', 1)
+            player = RPSNetwork.LobbyPlayer(sock, name, RPSNetwork.parse_features(features))
+            self.start_game(self.lobby.join(player))
+
+    def start_game(self, players):
+        """
+        Starts a game in a new coroutine.
+        :param players: A tuple of two LobbyPlayer objects or None.
+        """
+        if players is not None:
+            RPSNetwork.out('New game, lobby ' + str(self.lobby.metrics()))
+            self.loop.spawn(self.game(players[0], players[1]))
+
+    def game(self, p1, p2):
+        """
+        Coroutine, that handles a game like RPSNetwork.RPSThread.
+        :param p1: LobbyPlayer object of player 1.
+        :param p2: LobbyPlayer object of player 2.
+        """
+        RPSNetwork.out('New rps game started')
+        proto = RPSNetwork.RPSProtocol(p1, p2, self.graphs)
+        try:
+            is_over = False
+            while not is_over:
+                # Loop to process the protocol.
+                is_over = yield proto.step(p1.sock, p2.sock)
+        finally:
+            RPSNetwork.out('The current rps is over')
+
+            for player in [p1, p2]:
+                if player not in proto.rejoin or not self.running:
+                    player.sock.close()
+
+            if self.running:
+                self.start_game(self.lobby.game_over())
+                for player in proto.rejoin:
+                    self.loop.spawn(self.join(player.sock))
+
+    def metrics(self):
+        """
+        Returns the metrics of the lobby and the graph cache, see RPSNetwork.Lobby.metrics and
+        RPSNetwork.GraphCache.metrics.
+        """
+        metrics = self.lobby.metrics()
+        metrics.update(self.graphs.metrics())
+        return metrics
+
+
+def benchmark_client(sock, name, payload):
+    """
+    Coroutine, that plays one game over the wire protocol without any graph logic. The payload is sent
+    in place of each graph and each permutation.
+    :param sock: Non-blocking socket object, that is connected to the server.
+    :param name: The player name.
+    :param payload: String payload.
+    """
+    yield RPSNetwork.OP_SEND, sock, name
+    yield RPSNetwork.OP_SEND, sock, RPSNetwork.features_msg([])
+    yield RPSNetwork.OP_RECV, sock
+    yield RPSNetwork.OP_RECV, sock
+
+    if (yield RPSNetwork.OP_RECV, sock) == RPSNetwork.GRAPHS_NEED:
+        for i in range(0, 3):
+            yield RPSNetwork.OP_SEND, sock, payload
+    else:
+        # The graphs between GRAPHS_SEND_START and GRAPHS_SEND_END
+        for i in range(0, 4):
+            yield RPSNetwork.OP_RECV, sock
+
+    if (yield RPSNetwork.OP_RECV, sock) == RPSNetwork.TURN_NEED:
+        yield RPSNetwork.OP_SEND, sock, payload
+        yield RPSNetwork.OP_RECV, sock
+        yield RPSNetwork.OP_SEND, sock, payload
+    else:
+        yield RPSNetwork.OP_RECV, sock
+        yield RPSNetwork.OP_SEND, sock, payload
+        yield RPSNetwork.OP_RECV, sock
+
+    yield RPSNetwork.OP_SEND, sock, '0'
+    yield RPSNetwork.OP_SEND, sock, RPSNetwork.PLAY_AGAIN_FALSE
+    yield RPSNetwork.OP_RECV, sock
+    sock.close()
+
+
+def serve(engine, tcp_port, udp_port):
+    """
+    Runs a server with the given engine.
+    :param engine: 'event' for RPSEventServer or 'thread' for RPSNetwork.RPSServer.
+    :param tcp_port: The port to listen with the tcp socket.
+    :param udp_port: The port to listen with the udp socket.
+    """
+    if engine == 'event':
+        RPSEventServer().start(tcp_port, udp_port)
+    else:
+        RPSNetwork.RPSServer().start(tcp_port, udp_port)
+
+
+def wait_for_server(udp_port, timeout=5.0):
+    """
+    Sends discovery requests to the local host, until a server answers.
+    :param udp_port: The udp port of the server.
+    :param timeout: The maximal time to wait in seconds.
+    :return: Whether a server has answered or not.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.settimeout(0.1)
+    end = time.time() + timeout
+    try:
+        while time.time() < end:
+            s.sendto(RPSNetwork.REQ_HELLO, ('127.0.0.1', udp_port))
+            try:
+                if s.recvfrom(1024)[0] == RPSNetwork.ANS_HELLO:
+                    return True
+            except socket.error:
+                pass
+        return False
+    finally:
+        s.close()
+
+
+def peak_memory(pid):
+    """
+    Reads the peak resident memory of a process on Linux.
+    :param pid: The process id.
+    :return: The peak memory in kilobytes or None, if it is unknown.
+    """
+    try:
+        with open('/proc/' + str(pid) + '/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+def benchmark(engine, games, payload_size, tcp_port, udp_port):
+    """
+    Starts a server in a new process and plays the given number of games concurrently against it.
+    All clients are run by an EventLoop in this process.
+    :param engine: 'event' or 'thread'.
+    :param games: The number of concurrent games.
+    :param payload_size: The size of each graph and permutation in bytes.
+    :param tcp_port: The tcp port of the server.
+    :param udp_port: The udp port of the server.
+    :return: A tuple with the time in seconds and the peak memory of the server in kilobytes.
+    """
+    import multiprocessing
+
+    server = multiprocessing.Process(target=serve, args=(engine, tcp_port, udp_port))
+    server.daemon = True
+    server.start()
+
+    try:
+        if not wait_for_server(udp_port):
+            raise socket.error('The benchmark server does not answer')
+
+        start = time.time()
+        loop = EventLoop()
+        payload = 'g' * payload_size
+        for i in range(0, 2 * games):
+            sock = socket.create_connection(('127.0.0.1', tcp_port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setblocking(0)
+            loop.spawn(benchmark_client(sock, 'player' + str(i), payload))
+        loop.run()
+        elapsed = time.time() - start
+
+        return elapsed, peak_memory(server.pid)
+    finally:
+        server.terminate()
+        server.join()
+
+
+def main(argv):
+    """
+    Command line tool to run the event server or to compare it with the threaded server.
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Runs the RPS server in one event loop.')
+    parser.add_argument('--tcp-port', type=int, default=54321, help='the tcp port of the server')
+    parser.add_argument('--udp-port', type=int, default=54321, help='the udp port of the server')
+    parser.add_argument('--benchmark', type=int, nargs='*', metavar='GAMES',
+                        help='plays the given numbers of concurrent games against both engines')
+    parser.add_argument('--payload', type=int, default=4096, help='the graph size of the benchmark in bytes')
+    args = parser.parse_args(argv)
+
+    if args.benchmark is None:
+        RPSEventServer().start(args.tcp_port, args.udp_port)
+        return
+
+    for games in args.benchmark or [10, 100, 1000]:
+        for engine in ['thread', 'event']:
+            elapsed, memory = benchmark(engine, games, args.payload, args.tcp_port, args.udp_port)
+            print '%5d games, %-6s engine: %7.2f s %8.1f games/s, server peak memory %s kB' % (
+                games, engine, elapsed, games / elapsed, memory)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
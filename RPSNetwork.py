@@ -14,9 +14,15 @@ THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRI
 THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
 TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
-import socket, struct, threading, datetime
+import socket, struct, threading, datetime, zlib, weakref, types, collections, time, select, errno, json, os, hashlib
 from thread import *
 
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    # The lz4 compression is only offered if the lz4 package is installed.
+    lz4_block = None
+
 #
 # Broadcast message of the client.
 #
@@ -42,6 +48,23 @@ GRAPHS_SEND_START = 'START_SENDING_GRAPHS'
 #
 GRAPHS_SEND_END = 'END_SENDING_GRAPHS'
 
+#
+# Message of player 1, that offers a graph triple by its hash, see triple_hash, or requests fresh graphs
+# without a hash. The server asks player 2 with GRAPHS_REUSE, if it holds the triple.
+#
+GRAPHS_OFFER = 'OFFER_GRAPHS'
+
+#
+# Message to ask a player, if it holds the triple with the following hash.
+#
+GRAPHS_REUSE = 'REUSE_GRAPHS'
+
+#
+# Answer of a player, that holds the asked triple, and answer of the server, that player 1 uses
+# its offered triple without sending it.
+#
+GRAPHS_HAVE = 'HAVE_GRAPHS'
+
 #
 # Message to request a turn
 #
@@ -52,6 +75,23 @@ TURN_NEED = 'NEED_TURN'
 #
 TURN_SEND = 'SEND_TURN'
 
+#
+# Prefix of the commitment of player 1 in a turn with FEATURE_COMMIT. The hex SHA-256 digest of a nonce and
+# the encoded isomorphic copy of the chosen graph follows.
+#
+TURN_COMMIT = 'COMMIT_TURN'
+
+#
+# Prefix of the choice of player 2 in a turn with FEATURE_COMMIT. The graph index follows.
+#
+TURN_CHOICE = 'CHOICE_TURN'
+
+#
+# Prefix of the message of player 1, that reveals the committed graph. The graph index, the hex nonce and
+# the encoded isomorphism follow.
+#
+TURN_REVEAL = 'REVEAL_TURN'
+
 #
 # Request of a client when he want's a regame.
 #
@@ -62,57 +102,768 @@ PLAY_AGAIN_TRUE = 'PL_TRUE'
 #
 PLAY_AGAIN_FALSE = 'PL_FALSE'
 
+#
+# Prefix of the message with the features of a client. The server answers with the same prefix
+# and the features that both players support.
+#
+FEATURES = 'FEATURES'
+
+#
+# Feature: Large messages are compressed with lz4.
+#
+FEATURE_LZ4 = 'lz4'
+
+#
+# Feature: Large messages are compressed with zlib.
+#
+FEATURE_ZLIB = 'zlib'
+
+#
+# Feature: The graphs of a game are shared in one batch message, see GraphCodec.encode_batch.
+#
+FEATURE_BATCH = 'batch'
+
+#
+# Feature: The server caches the graph triples by their hash and the players reuse triples, that they
+# already hold, see share_cached_graphs. This feature requires FEATURE_BATCH.
+#
+FEATURE_GRAPH_CACHE = 'gcache'
+
+#
+# Feature: Player 1 sends the seed of generated graphs instead of their edges and player 2 generates the
+# same graphs, see GraphCodec.encode_seed. The number is the version of Graphs.SeedRandom, so only players
+# with the same generator agree on it. This feature requires FEATURE_BATCH.
+#
+FEATURE_SEED = 'seed1'
+
+#
+# Feature: The turns send a commitment to the choice instead of graphs. Player 1 sends the SHA-256
+# digest of its choice and a random nonce, player 2 sends its choice and player 1 reveals the choice
+# and the nonce, so player 2 can verify it.
+#
+FEATURE_COMMIT = 'commit'
+
+#
+# All features in the order of preference. The server relays compressed frames unchanged, so it
+# agrees on a compression even if it could not decompress it. Then it does not agree on FEATURE_GRAPH_CACHE,
+# because the cache decompresses the triples to hash them, see prepare.
+#
+KNOWN_FEATURES = [FEATURE_LZ4, FEATURE_ZLIB, FEATURE_BATCH, FEATURE_GRAPH_CACHE, FEATURE_SEED, FEATURE_COMMIT]
+
+#
+# Frame flag: The payload is compressed with zlib.
+#
+FLAG_ZLIB = 0x80000000
+
+#
+# Frame flag: The payload is compressed with lz4.
+#
+FLAG_LZ4 = 0x40000000
+
+#
+# Frame flag: The payload is a chunk of a message and more chunks of the same message follow.
+# The last chunk of a message has no FLAG_MORE.
+#
+FLAG_MORE = 0x20000000
+
+#
+# Mask for the payload length in the frame header. The remaining bits are flags.
+#
+LENGTH_MASK = 0x1FFFFFFF
+
+#
+# Messages longer than this number of bytes are sent in chunks.
+#
+CHUNK_SIZE = 16384
+
+#
+# The default zlib compression level.
+#
+ZLIB_LEVEL = 6
+
+#
+# Messages shorter than this number of bytes are never compressed.
+#
+COMPRESS_MIN_SIZE = 512
+
+#
+# The initial size of the receive buffer of a socket in bytes.
+#
+RECV_BUFFER_SIZE = 65536
+
+#
+# Payloads up to this number of bytes are copied into one string with the header before sending.
+# Larger payloads are sent without a copy in a second call.
+#
+SEND_COPY_LIMIT = 16384
+
+#
+# After the first discovery answer, the client waits for more answers during this factor times the
+# round-trip time of the first answer, but at least DISCOVERY_MIN_WINDOW seconds.
+#
+DISCOVERY_WINDOW_FACTOR = 4
+DISCOVERY_MIN_WINDOW = 0.05
+
+#
+# Discovered servers are cached for this number of seconds, see DiscoveryCache.
+#
+DISCOVERY_CACHE_TTL = 600
+
+#
+# The receive buffer size of the server's udp socket, so bursts of discovery requests are not dropped.
+#
+UDP_BUFFER_SIZE = 262144
+
+#
+# The maximal number of graph triples, that a server or a client caches.
+#
+GRAPH_CACHE_SIZE = 256
+
+#
+# The size of the listen backlog of the server's tcp socket.
+#
+LISTEN_BACKLOG = 128
+
+#
+# The receive buffer of each socket, see get_buffer.
+#
+_buffers = weakref.WeakKeyDictionary()
+
+#
+# Operations, that the protocol steps yield. A step is a generator, that is run by run_step with blocking
+# sockets or by RPSEventServer.EventLoop with non-blocking sockets.
+# (OP_RECV, sock) is answered with the received message or None, if the connection is closed.
+# (OP_RECV_ANY, socks) is answered with the socket, whose message arrives first, and the message, see recv_any.
+# (OP_SEND, sock, msg) sends an uncompressed message.
+# (OP_RELAY, src, dst) is answered with the result of relay_msg. (OP_RELAY, src, dst, frames) appends a copy
+# of each relayed frame to the list frames as well.
+# (OP_SEND_FRAMES, sock, frames) sends a list of (flags, payload) frames unchanged.
+# (OP_RESULT, value) ends the step with the given value. A step, that ends without it, returns None.
+# A step can also yield another step and is answered with its result.
+#
+OP_RECV = 'recv'
+OP_RECV_ANY = 'recv_any'
+OP_SEND = 'send'
+OP_RELAY = 'relay'
+OP_SEND_FRAMES = 'send_frames'
+OP_RESULT = 'result'
+
 
 #
 # Helper functions
 #
-def send_msg(sock, msg):
+def send_msg(sock, msg, compression=None):
     """
     Sends the given message with the given socket. This function appends four bytes at the begin of msg.
-    These four bytes contains the length of the origin msg.
+    These four bytes contains the length of the origin msg and the frame flags. Messages longer than
+    CHUNK_SIZE are sent in chunks, see send_chunks.
     :param sock: Socket object to send.
     :param msg: String message.
+    :param compression: A Compression object or None to send the message uncompressed.
+    """
+    for flags, payload in iter_frames(msg, compression):
+        send_frame(sock, flags, payload)
+
+
+def iter_frames(msg, compression=None):
+    """
+    Splits the given message into frames as send_msg sends them.
+    :param msg: String message.
+    :param compression: A Compression object or None to send the message uncompressed.
+    :return: A generator of tuples with the flags and the payload of each frame.
     """
+    if len(msg) > CHUNK_SIZE:
+        chunks = (msg[i:i + CHUNK_SIZE] for i in xrange(0, len(msg), CHUNK_SIZE))
+        for frame in iter_chunk_frames(chunks, compression):
+            yield frame
+        return
+
+    flags = 0
+    if compression is not None:
+        flags, msg = compression.compress(msg)
+    yield flags, msg
 
-    # Stores the length of message in big-endian order
-    msg = struct.pack('>I', len(msg)) + msg
+
+def send_chunks(sock, chunks, compression=None):
+    """
+    Sends one message, that is given as chunks. Each chunk is sent as frame with FLAG_MORE, except the
+    last one. The chunks are compressed independently, so only one chunk must be in memory.
+    :param sock: Socket object to send.
+    :param chunks: An iterable of strings.
+    :param compression: A Compression object or None to send the chunks uncompressed.
+    """
+    for flags, payload in iter_chunk_frames(chunks, compression):
+        send_frame(sock, flags, payload)
+
+
+def iter_chunk_frames(chunks, compression=None):
+    """
+    Creates the frames of a message, that is given as chunks, see send_chunks.
+    :param chunks: An iterable of strings.
+    :param compression: A Compression object or None to send the chunks uncompressed.
+    :return: A generator of tuples with the flags and the payload of each frame.
+    """
+    prev = None
+    for chunk in chunks:
+        if prev is not None:
+            yield chunk_frame(prev, FLAG_MORE, compression)
+        prev = chunk
+
+    if prev is None:
+        prev = ''
+    yield chunk_frame(prev, 0, compression)
+
+
+def chunk_frame(chunk, more, compression):
+    """
+    Creates the frame of a chunk.
+    :param chunk: String chunk.
+    :param more: FLAG_MORE or 0 for the last chunk.
+    :param compression: A Compression object or None.
+    :return: A tuple with the flags and the payload.
+    """
+    flags = 0
+    if compression is not None:
+        flags, chunk = compression.compress(to_string(chunk))
+    return flags | more, chunk
+
+
+def send_frame(sock, flags, payload):
+    """
+    Sends a frame with the given flags and payload.
+    :param sock: Socket object to send.
+    :param flags: The FLAG_ bits of the frame.
+    :param payload: String payload.
+    """
+    header = frame_header(flags, payload)
 
     # Writes all bytes to the stream
-    sock.sendall(msg)
+    if len(payload) <= SEND_COPY_LIMIT:
+        sock.sendall(header + to_string(payload))
+    else:
+        sock.sendall(header)
+        sock.sendall(payload)
+
+
+def frame_header(flags, payload):
+    """
+    Creates the four header bytes of a frame.
+    :param flags: The FLAG_ bits of the frame.
+    :param payload: String payload.
+    :return: The header string.
+    """
+    if len(payload) > LENGTH_MASK:
+        raise ValueError('The message is too long for a frame')
+
+    # Stores the length and the flags of message in big-endian order
+    return struct.pack('>I', flags | len(payload))
 
 
 def recv_msg(sock):
     """
     Receives a message from the given socket. This function reads the first four bytes from the stream
     to determine the byte-length of the message. Afterwards it reads exactly so many bytes from
-    the stream.
+    the stream. Compressed messages are decompressed and chunks are joined.
     :param sock: Socket object to receive.
     """
-
-    # Reads message length and unpack it into an integer
-    raw_msglen = recvall(sock, 4)
-    if not raw_msglen:
+    frame = recv_frame(sock)
+    if frame is None:
         return None
-    msglen = struct.unpack('>I', raw_msglen)[0]
+    if not frame[0] & FLAG_MORE:
+        return decompress(frame[0], frame[1])
 
-    # Reads the whole message
-    return recvall(sock, msglen)
+    parts = [decompress(frame[0], frame[1])]
+    while frame[0] & FLAG_MORE:
+        frame = recv_frame(sock)
+        if frame is None:
+            return None
+        parts.append(decompress(frame[0], frame[1]))
+    return ''.join(parts)
 
 
-def recvall(sock, n):
+def recv_any(socks):
     """
-    Reads bytes from the given socket stream as long as the received data length is lower than n.
-    :param sock: Socket object to receive data.
-    :param n: The target length of the message.
+    Receives the next message of the socket, whose message arrives first. The sockets are watched with
+    select, until one of them has a whole frame buffered, so a slow socket does not delay the others.
+    :param socks: A list of socket objects.
+    :return: A tuple with the socket and the message or None, if the connection is closed.
     """
+    while True:
+        for sock in socks:
+            if get_buffer(sock).has_frame():
+                return sock, recv_msg(sock)
 
-    data = ''
-    while len(data) < n:
-        packet = sock.recv(n - len(data))
-        if not packet:
-            return None
-        data += packet
-    return data
+        for sock in select.select(socks, [], [])[0]:
+            buf = get_buffer(sock)
+            buf.reserve(buf.needed())
+            if not buf.fill(sock):
+                return sock, None
+
+
+def recv_chunks(sock):
+    """
+    Receives the next message chunk by chunk. A message that is not chunked is yielded as one chunk.
+    :param sock: Socket object to receive.
+    :return: A generator of strings. It ends early, if the connection is closed.
+    """
+    while True:
+        frame = recv_frame(sock)
+        if frame is None:
+            return
+        yield decompress(frame[0], frame[1])
+        if not frame[0] & FLAG_MORE:
+            return
+
+
+def recv_frame(sock):
+    """
+    Receives a frame from the given socket without decompressing it. The payload is a memoryview
+    into the receive buffer of the socket, see RecvBuffer.
+    :param sock: Socket object to receive.
+    :return: A tuple with the flags and the payload or None, if the connection is closed.
+    """
+    return get_buffer(sock).read_frame(sock)
+
+
+def get_buffer(sock, size=RECV_BUFFER_SIZE):
+    """
+    Returns the receive buffer of the given socket. The buffer is created on the first request.
+    All frames of a socket must be received with its buffer, because it may hold the bytes of
+    the next frames.
+    :param sock: Socket object to receive.
+    :param size: The initial size of a new buffer in bytes.
+    :return: The RecvBuffer object.
+    """
+    buf = _buffers.get(sock)
+    if buf is None:
+        buf = RecvBuffer(size)
+        _buffers[sock] = buf
+    return buf
+
+
+class RecvBuffer:
+    """
+    This class represents the receive buffer of a socket. The bytes are received into a preallocated
+    bytearray with recv_into, as many as available. One read can contain several frames. The frames
+    are handed out as memoryviews of the buffer without copying. A buffer is never written again
+    after a frame of it has been handed out; if it is full, a new buffer is allocated and only
+    the incomplete frame is moved. The buffer does not reference its socket, so it is released
+    together with the socket, see get_buffer.
+    """
+    def __init__(self, size=RECV_BUFFER_SIZE):
+        """
+        Creates a new RecvBuffer object.
+        :param size: The initial size of the buffer in bytes.
+        """
+        self.size = size
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+
+        # The unread bytes are self.buf[self.start:self.end]
+        self.start = 0
+        self.end = 0
+
+    def reserve(self, n):
+        """
+        Makes sure that the buffer has space for n bytes from self.start.
+        :param n: The number of bytes.
+        """
+        if self.start + n <= len(self.buf):
+            return
+
+        buf = bytearray(max(self.size, n))
+        unread = self.end - self.start
+        buf[0:unread] = self.view[self.start:self.end]
+        self.buf = buf
+        self.view = memoryview(buf)
+        self.start = 0
+        self.end = unread
+
+    def fill(self, sock):
+        """
+        Receives as many bytes as available and as fit into the buffer.
+        :param sock: Socket object to receive.
+        :return: False, if the connection is closed.
+        """
+        n = sock.recv_into(self.view[self.end:])
+        if n == 0:
+            return False
+        self.end += n
+        return True
+
+    def read_frame(self, sock):
+        """
+        Reads the next frame. The socket is only read, if the buffer does not contain a whole frame.
+        :param sock: Socket object to receive.
+        :return: A tuple with the flags and the payload as memoryview or None, if the connection is closed.
+        """
+        while True:
+            needed = self.needed()
+            if self.end - self.start >= needed:
+                header = struct.unpack_from('>I', self.buf, self.start)[0]
+                payload = self.view[self.start + 4:self.start + needed]
+                self.start += needed
+                return header & ~LENGTH_MASK, payload
+
+            self.reserve(needed)
+            if not self.fill(sock):
+                return None
+
+    def needed(self):
+        """
+        Returns the size of the next frame with its header. If the header is not buffered yet,
+        only the header size is known.
+        :return: The number of bytes from self.start.
+        """
+        if self.end - self.start < 4:
+            return 4
+        header = struct.unpack_from('>I', self.buf, self.start)[0]
+        return 4 + (header & LENGTH_MASK)
+
+    def has_frame(self):
+        """
+        Checks if the buffer contains a whole frame, so read_frame does not have to read the socket.
+        :return: True, if a whole frame is buffered.
+        """
+        return self.end - self.start >= self.needed()
+
+
+def relay_msg(src, dst, frames=None):
+    """
+    Receives a message from src and sends it unchanged to dst. A compressed message stays compressed.
+    The chunks of a message are forwarded as they arrive, so only one chunk is held in memory.
+    :param src: Socket object to receive.
+    :param dst: Socket object to send.
+    :param frames: A list, that a copy of each frame is appended to, or None.
+    :return: Whether the whole message was relayed or not.
+    """
+    while True:
+        frame = recv_frame(src)
+        if frame is None:
+            return False
+        if frames is not None:
+            frames.append((frame[0], to_string(frame[1])))
+        send_frame(dst, frame[0], frame[1])
+        if not frame[0] & FLAG_MORE:
+            return True
+
+
+def join_frames(frames):
+    """
+    Decompresses and joins the frames of a message.
+    :param frames: A list of (flags, payload) tuples.
+    :return: The message string.
+    """
+    return ''.join(decompress(flags, payload) for flags, payload in frames)
+
+
+def frames_supported(frames, features):
+    """
+    Checks, if a player with the given features can read the frames as they are.
+    :param frames: A list of (flags, payload) tuples.
+    :param features: The features of the player.
+    :return: False, if a frame is compressed with a method, that is not in features.
+    """
+    for flags, payload in frames:
+        if flags & FLAG_ZLIB and FEATURE_ZLIB not in features:
+            return False
+        if flags & FLAG_LZ4 and FEATURE_LZ4 not in features:
+            return False
+    return True
+
+
+def to_string(payload):
+    """
+    Converts the given payload into a string. A memoryview is copied, a string is returned as it is.
+    :param payload: String or memoryview payload.
+    :return: The payload as string.
+    """
+    if isinstance(payload, memoryview):
+        return payload.tobytes()
+    return payload
+
+
+def decompress(flags, payload):
+    """
+    Decompresses the given payload according to the frame flags.
+    :param flags: The FLAG_ bits of the frame.
+    :param payload: String payload.
+    :return: The uncompressed message as string.
+    """
+    payload = to_string(payload)
+    if flags & FLAG_ZLIB:
+        return zlib.decompress(payload)
+    if flags & FLAG_LZ4:
+        if lz4_block is None:
+            raise ValueError('Received a lz4 frame, but lz4 is not installed')
+        return lz4_block.decompress(payload)
+    return payload
+
+
+def local_features():
+    """
+    Returns the features that this installation supports.
+    :return: A list of FEATURE_ constants in the order of preference.
+    """
+    features = [FEATURE_ZLIB, FEATURE_BATCH, FEATURE_GRAPH_CACHE, FEATURE_SEED, FEATURE_COMMIT]
+    if lz4_block is not None:
+        features.insert(0, FEATURE_LZ4)
+    return features
+
+
+def features_msg(features):
+    """
+    Creates a features message.
+    :param features: A list of FEATURE_ constants.
+    :return: The message string.
+    """
+    return ' '.join([FEATURES] + list(features))
+
+
+def parse_features(msg):
+    """
+    Reads the features of a features message.
+    :param msg: The message string.
+    :return: A list of FEATURE_ constants. The list is empty, if msg is not a features message.
+    """
+    if msg is None or not msg.startswith(FEATURES):
+        return []
+    return msg.split()[1:]
+
+
+def answer_discovery(sock, msg, addr):
+    """
+    Answers a discovery request. Other messages are ignored. The answer is dropped, if the send buffer
+    of the socket is full, so the listener never blocks. The client repeats the discovery anyway.
+    :param sock: The udp socket of the server.
+    :param msg: The received message.
+    :param addr: The address of the client.
+    """
+    if msg != REQ_HELLO:
+        return
+    try:
+        sock.sendto(ANS_HELLO, getattr(socket, 'MSG_DONTWAIT', 0), addr)
+    except socket.error, e:
+        if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+            out('Discovery answer failed: ' + str(e))
+
+
+def probe_servers(targets, timeout, broadcast=False):
+    """
+    Sends a discovery request to each target and collects the answers. The collection ends at the
+    timeout, when all targets have answered or at the end of an adaptive window after the first answer,
+    see DISCOVERY_WINDOW_FACTOR.
+    :param targets: A list of address tuples.
+    :param timeout: The maximal time to wait in seconds.
+    :param broadcast: Whether the targets contain broadcast addresses or not.
+    :return: A list of (address, round-trip time) tuples, sorted by the round-trip time.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if broadcast:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    answers = {}
+    try:
+        start = time.time()
+        for target in targets:
+            s.sendto(REQ_HELLO, target)
+
+        end = start + timeout
+        while True:
+            remaining = end - time.time()
+            if remaining <= 0 or (not broadcast and len(answers) == len(targets)):
+                break
+            if not select.select([s], [], [], remaining)[0]:
+                break
+
+            msg, addr = s.recvfrom(1024)
+            if msg != ANS_HELLO or addr in answers:
+                continue
+            rtt = time.time() - start
+            answers[addr] = rtt
+
+            if len(answers) == 1:
+                # The first answer shortens the timeout to the window for the other answers.
+                end = min(end, time.time() + max(DISCOVERY_MIN_WINDOW, DISCOVERY_WINDOW_FACTOR * rtt))
+    except socket.error, msg:
+        out('Discovery failed: ' + str(msg))
+    finally:
+        s.close()
+
+    return sorted(answers.items(), key=lambda a: a[1])
+
+
+class DiscoveryCache:
+    """
+    This class represents a file, that stores the recently discovered servers for each port. The entries
+    expire after the time to live.
+    """
+    def __init__(self, path, ttl=DISCOVERY_CACHE_TTL):
+        """
+        Creates a new DiscoveryCache object.
+        :param path: The path of the cache file.
+        :param ttl: The time to live of the entries in seconds.
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def load(self):
+        """
+        Reads the cache file.
+        :return: A dict, that maps each port as string to a dict with a time and a list of servers.
+        """
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            if isinstance(entries, dict):
+                return entries
+        except (IOError, ValueError):
+            pass
+        return {}
+
+    def get(self, port):
+        """
+        Returns the cached servers of the given port.
+        :param port: The discovery port.
+        :return: A list of address tuples, sorted by their round-trip time. The list is empty, if
+        there is no entry or the entry is expired.
+        """
+        entry = self.load().get(str(port))
+        if entry is None or time.time() - entry.get('time', 0) > self.ttl:
+            return []
+        return [(host, p) for host, p in entry.get('servers', [])]
+
+    def put(self, port, servers):
+        """
+        Stores the servers of the given port. The file is replaced atomically.
+        :param port: The discovery port.
+        :param servers: A list of address tuples, sorted by their round-trip time.
+        """
+        entries = self.load()
+        entries[str(port)] = {'time': time.time(), 'servers': [list(addr) for addr in servers]}
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(entries, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError), e:
+            out('The discovery cache can not be written: ' + str(e))
+
+
+def triple_hash(batch):
+    """
+    Returns the content hash of a graph triple.
+    :param batch: The batch message of the triple, see GraphCodec.encode_batch.
+    :return: The hex digest string.
+    """
+    return hashlib.sha1(batch).hexdigest()
+
+
+class GraphCache:
+    """
+    This class stores the frames of the batch messages of graph triples by their hash, as player 1 has sent
+    them, so a cached triple stays compressed. The least recently used triple
+    is removed, when the cache is full. The cache is used by several threads, so all methods are
+    synchronized.
+    """
+    def __init__(self, size=GRAPH_CACHE_SIZE):
+        """
+        Creates a new GraphCache object.
+        :param size: The maximal number of triples.
+        """
+        self.size = size
+        self.triples = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, h):
+        """
+        Returns the triple with the given hash.
+        :param h: The hash of the triple.
+        :return: A list of (flags, payload) frames or None, if the triple is not cached.
+        """
+        with self.lock:
+            frames = self.triples.pop(h, None)
+            if frames is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.triples[h] = frames
+            return frames
+
+    def put(self, frames):
+        """
+        Adds a triple to the cache.
+        :param frames: The frames of the batch message of the triple.
+        :return: The hash of the triple, see triple_hash.
+        """
+        h = triple_hash(join_frames(frames))
+        with self.lock:
+            self.triples.pop(h, None)
+            self.triples[h] = frames
+            while len(self.triples) > self.size:
+                self.triples.popitem(last=False)
+        return h
+
+    def metrics(self):
+        """
+        Returns the current metrics of the cache.
+        :return: A dict with the number of cached triples and the number of cache hits and misses.
+        """
+        with self.lock:
+            return {'cached_triples': len(self.triples), 'cache_hits': self.hits, 'cache_misses': self.misses}
+
+
+class Compression:
+    """
+    This class represents the compression settings of a connection.
+    """
+    def __init__(self, method, level=ZLIB_LEVEL, min_size=COMPRESS_MIN_SIZE):
+        """
+        Creates a new Compression object.
+        :param method: FEATURE_ZLIB or FEATURE_LZ4.
+        :param level: The zlib compression level.
+        :param min_size: Messages shorter than this number of bytes are not compressed.
+        """
+        self.method = method
+        self.level = level
+        self.min_size = min_size
+
+    @staticmethod
+    def from_features(features, level=ZLIB_LEVEL):
+        """
+        Creates a Compression object for the preferred compression in the given features.
+        :param features: The agreed features.
+        :param level: The zlib compression level.
+        :return: The Compression object or None, if there is no common compression.
+        """
+        for method in local_features():
+            if method in features:
+                return Compression(method, level)
+        return None
+
+    def compress(self, msg):
+        """
+        Compresses the given message, if it is long enough and the compression makes it shorter.
+        :param msg: String message.
+        :return: A tuple with the frame flags and the payload.
+        """
+        if len(msg) < self.min_size:
+            return 0, msg
+
+        if self.method == FEATURE_LZ4:
+            flag = FLAG_LZ4
+            data = lz4_block.compress(msg)
+        else:
+            flag = FLAG_ZLIB
+            data = zlib.compress(msg, self.level)
+
+        if len(data) >= len(msg):
+            return 0, msg
+        return flag, data
 
 
 def out(msg):
@@ -125,20 +876,142 @@ def out(msg):
     #print (now.__str__() + ' - ' + msg)
 
 
+class LobbyPlayer:
+    """
+    This class represents a connected player, that has introduced itself to the server.
+    """
+    def __init__(self, sock, name, features):
+        """
+        Creates a new LobbyPlayer object.
+        :param sock: Socket of the player.
+        :param name: The player name.
+        :param features: The features, that the player supports.
+        """
+        self.sock = sock
+        self.name = name
+        self.features = features
+
+        # The time, when the player has joined the lobby.
+        self.since = None
+
+
+class Lobby:
+    """
+    This class represents the queue of players, that wait for an opponent. The players are paired in
+    the order they join. The lobby is used by several threads, so all methods are synchronized.
+    """
+    def __init__(self, max_games=0):
+        """
+        Creates a new Lobby object.
+        :param max_games: The maximal number of running games or 0 for no limit.
+        """
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self.max_games = max_games
+        self.games = 0
+
+        # Metrics
+        self.max_depth = 0
+        self.matched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def join(self, player):
+        """
+        Adds a player to the queue.
+        :param player: The LobbyPlayer object.
+        :return: A tuple of two LobbyPlayer objects, if a game can start, otherwise None.
+        """
+        with self.lock:
+            player.since = time.time()
+            self.queue.append(player)
+            self.max_depth = max(self.max_depth, len(self.queue))
+            return self.next_game()
+
+    def clear(self):
+        """
+        Removes all waiting players from the queue.
+        :return: A list of the removed LobbyPlayer objects.
+        """
+        with self.lock:
+            players = list(self.queue)
+            self.queue.clear()
+            return players
+
+    def take_lone(self, player):
+        """
+        Removes the given player from the queue, if it is the only waiting player.
+        :param player: The LobbyPlayer object.
+        :return: Whether the player is removed or not.
+        """
+        with self.lock:
+            if len(self.queue) == 1 and self.queue[0] is player:
+                self.queue.popleft()
+                return True
+            return False
+
+    def game_over(self):
+        """
+        Frees the slot of a finished game.
+        :return: A tuple of two LobbyPlayer objects, if a waiting game can start now, otherwise None.
+        """
+        with self.lock:
+            self.games -= 1
+            return self.next_game()
+
+    def next_game(self):
+        """
+        Takes the next two players from the queue, if there is a free slot. The lock must be held.
+        :return: A tuple of two LobbyPlayer objects or None.
+        """
+        if len(self.queue) < 2 or 0 < self.max_games <= self.games:
+            return None
+
+        self.games += 1
+        now = time.time()
+        players = (self.queue.popleft(), self.queue.popleft())
+        for player in players:
+            wait = now - player.since
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        self.matched += 2
+        return players
+
+    def metrics(self):
+        """
+        Returns the current metrics of the lobby.
+        :return: A dict with the queue depth, the maximal queue depth, the number of running games,
+        the number of matched players and the mean and maximal wait time in seconds.
+        """
+        with self.lock:
+            mean_wait = 0.0
+            if self.matched > 0:
+                mean_wait = self.total_wait / self.matched
+            return {'queue_depth': len(self.queue), 'max_queue_depth': self.max_depth, 'games': self.games,
+                    'matched': self.matched, 'mean_wait': mean_wait, 'max_wait': self.max_wait}
+
+
 class RPSServer:
     """
     This class represents the server side of the RPS network.
     """
 
-    def __init__(self):
+    def __init__(self, max_games=0):
         """
         Creates a new RPSServer object.
+        :param max_games: The maximal number of running games or 0 for no limit.
         """
         self.running = False
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock_udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.p1 = None
-        self.p2 = None
+        self.lobby = Lobby(max_games)
+        self.graphs = GraphCache()
+
+        # Is set, when both sockets are listening or the start has failed, see wait_ready.
+        self.ready = threading.Event()
+
+        # The thread of start_background or None.
+        self.thread = None
 
     def udp_listener(self):
         """
@@ -146,20 +1019,25 @@ class RPSServer:
         """
         while self.running:
             m = self.sock_udp.recvfrom(1024)
-            self.sock_udp.sendto(ANS_HELLO, m[1])
+            if not self.running:
+                break
+            answer_discovery(self.sock_udp, m[0], m[1])
+        self.sock_udp.close()
 
     def start(self, tcp_port, udp_port):
         """
-        Starts listening on udp and tcp sockets.
+        Starts listening on udp and tcp sockets. This function returns, when the server is stopped.
         :param tcp_port: The port to listen with the tcp socket.
         :param udp_port: The port to listen with the udp socket.
         """
         self.running = True
 
         try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.sock.bind(('', tcp_port))
+            self.sock_udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_BUFFER_SIZE)
             self.sock_udp.bind(('', udp_port))
-            self.sock.listen(2)
+            self.sock.listen(LISTEN_BACKLOG)
 
             start_new_thread(self.udp_listener, ())
 
@@ -168,103 +1046,208 @@ class RPSServer:
 
         except socket.error, msg:
             self.sock.close()
+            self.sock_udp.close()
             self.sock = None
             self.running = False
             print 'Bind failed. Error Code : ' + str(msg[0]) + ' Message ' + msg[1]
 
+        self.ready.set()
+
         if self.sock is not None:
-            gt = None
             while self.running:
                 conn, addr = self.sock.accept()
-
-                if self.p1 is None:
-                    self.p1 = conn
-                    out('Player 1 is connected')
-                elif self.p2 is None:
-                    self.p2 = conn
-                    out('Player 2 is connected')
-                else:
+                if not self.running:
+                    # The connection of stop
                     conn.close()
-                    out('rps is already running')
+                    break
 
-                if gt is None and self.p1 is not None and self.p2 is not None:
-                    # If both players are connected, start the game
+                # Large frames are sent in two calls, see send_frame.
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                out('A player is connected')
 
-                    gt = RPSThread(self.p1, self.p2)
-                    gt.start()
+                # The player introduces itself in its own thread, so a slow player does not block the others.
+                start_new_thread(self.join, (conn,))
+            self.sock.close()
+
+    def start_background(self, tcp_port, udp_port):
+        """
+        Starts the server in a new daemon thread. Use wait_ready to wait until the server is listening.
+        :param tcp_port: The port to listen with the tcp socket.
+        :param udp_port: The port to listen with the udp socket.
+        """
+        self.thread = threading.Thread(target=self.start, args=(tcp_port, udp_port))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wait_ready(self, timeout=None):
+        """
+        Waits until both sockets are listening or the start has failed.
+        :param timeout: The maximal time to wait in seconds or None to wait without limit.
+        :return: Whether the server is listening or not.
+        """
+        self.ready.wait(timeout)
+        return self.ready.is_set() and self.running
+
+    def stop(self):
+        """
+        Stops listening and closes the connections of the players, that are waiting in the lobby.
+        Running games are finished by their threads.
+        """
+        if not self.running:
+            return
+        self.running = False
+
+        # Wakes up the threads, that wait for a connection and for a discovery request.
+        try:
+            socket.create_connection(('127.0.0.1', self.sock.getsockname()[1])).close()
+            wake = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            wake.sendto(REQ_HELLO, ('127.0.0.1', self.sock_udp.getsockname()[1]))
+            wake.close()
+        except socket.error:
+            pass
+
+        for player in self.lobby.clear():
+            player.sock.close()
+
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def join(self, sock):
+        """
+        Receives the name and the features of a player and adds it to the lobby.
+        :param sock: Socket of the player.
+        """
+        player = run_step(hello(sock))
+        if player is None or not self.running:
+            sock.close()
+            return
+        self.start_game(self.lobby.join(player))
+
+    def start_game(self, players):
+        """
+        Starts a game in a new RPSThread.
+        :param players: A tuple of two LobbyPlayer objects or None.
+        """
+        if players is not None:
+            out('New game, lobby ' + str(self.lobby.metrics()))
+            RPSThread(players[0], players[1], self).start()
+
+    def game_over(self, rejoin):
+        """
+        Frees the slot of a finished game and starts the next waiting game.
+        :param rejoin: The LobbyPlayer objects, that rejoin the lobby.
+        """
+        self.start_game(self.lobby.game_over())
+        for player in rejoin:
+            start_new_thread(self.join, (player.sock,))
+
+    def metrics(self):
+        """
+        Returns the metrics of the lobby and the graph cache, see Lobby.metrics and
+        GraphCache.metrics.
+        """
+        metrics = self.lobby.metrics()
+        metrics.update(self.graphs.metrics())
+        return metrics
 
 
 class RPSThread(threading.Thread):
     """
     This class represents a thread to handle a game.
     """
-    def __init__(self, p1, p2):
+    def __init__(self, p1, p2, server=None):
         """
         Creates a new RPSThread object.
-        :param p1: Socket of player 1.
-        :param p2: Socket of player 2.
+        :param p1: LobbyPlayer object of player 1.
+        :param p2: LobbyPlayer object of player 2.
+        :param server: The RPSServer, that is notified at the end of the game, or None.
         """
         threading.Thread.__init__(self)
         self.p1 = p1
         self.p2 = p2
+        self.server = server
 
     def run(self):
         is_over = False
 
-        proto = RPSProtocol()
+        proto = RPSProtocol(self.p1, self.p2, self.server.graphs if self.server is not None else None)
 
         out('New rps game started')
 
-        while not is_over:
-            # Loop to process the protocol.
-            is_over = proto.next_step(self.p1, self.p2)
+        try:
+            while not is_over:
+                # Loop to process the protocol.
+                is_over = proto.next_step(self.p1.sock, self.p2.sock)
+        finally:
+            out('The current rps is over')
 
-        out('The current rps is over')
+            for player in [self.p1, self.p2]:
+                if player not in proto.rejoin:
+                    player.sock.close()
 
-        self.p1.close()
-        self.p2.close()
+            if self.server is not None:
+                self.server.game_over(proto.rejoin)
 
 
 class RPSClient:
     """
     This class represents the client side of the RPS network
     """
-    def __init__(self, timeout=5):
+    def __init__(self, timeout=5, compression_level=ZLIB_LEVEL, cache=None):
         """
         Creates a new RPSClient object.
         :param timeout: The timeout of the diagram socket in seconds. The default value are 5 seconds.
+        :param compression_level: The zlib level, if zlib compression is agreed on.
+        :param cache: A DiscoveryCache object or None.
         """
         self.sock = None
         self.timeout = timeout
+        self.compression_level = compression_level
+        self.cache = cache
+
+        # The features agreed on with the server and the resulting compression settings.
+        self.features = []
+        self.compression = None
+
+    def set_features(self, features):
+        """
+        Applies the features, that the server has agreed on.
+        :param features: A list of FEATURE_ constants.
+        """
+        self.features = list(features)
+        self.compression = Compression.from_features(self.features, self.compression_level)
 
     def discover(self, srv_port):
         """
-        Sends a broadcast to look for a RPSServer on the given port.
+        Looks for a RPSServer on the given port, see discover_all.
         :param srv_port: The port number of the RPSServer.
-        :return: The address tuple of the RPSServer or None, if it can't find a server.
+        :return: The address tuple of the nearest RPSServer or None, if it can't find a server.
         """
-        addr = None
-        answ = None
-
-        # Creates a new datagram socket to broadcast
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        s.settimeout(self.timeout)
-        s.sendto(REQ_HELLO, ('255.255.255.255', srv_port))
-
-        # Wait for a server answer
-        try:
-            answ = s.recvfrom(1024)
-        except socket.timeout:
+        servers = self.discover_all(srv_port)
+        if len(servers) == 0:
             print 'Timeout exceeded...'
+            return None
+        return servers[0]
 
-        # Close the diagram socket.
-        s.close()
-
-        if answ is not None and answ[0] == ANS_HELLO:
-            # Saves the address if the server answer was correct.
-            addr = answ[1]
-        return addr
+    def discover_all(self, srv_port):
+        """
+        Looks for all RPSServers on the given port. The cached servers are asked first. If none of
+        them answers, a broadcast is sent and the answers are cached.
+        :param srv_port: The port number of the RPSServer.
+        :return: A list of server address tuples, sorted by their round-trip time.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(srv_port)
+            if len(cached) > 0:
+                answers = probe_servers(cached, min(self.timeout, 1.0))
+                if len(answers) > 0:
+                    return [addr for addr, rtt in answers]
+
+        answers = probe_servers([('255.255.255.255', srv_port)], self.timeout, broadcast=True)
+        servers = [addr for addr, rtt in answers]
+        if self.cache is not None and len(servers) > 0:
+            self.cache.put(srv_port, servers)
+        return servers
 
     def connect(self, addr):
         """
@@ -277,6 +1260,7 @@ class RPSClient:
 
         try:
             self.sock.connect(addr)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             result = True
         except socket.error, msg:
             self.sock = None
@@ -292,7 +1276,20 @@ class RPSClient:
         """
         if self.sock is not None:
             try:
-                send_msg(self.sock, msg)
+                send_msg(self.sock, msg, self.compression)
+            except socket.error, msg:
+                self.sock = None
+                print 'Send failed. Error Code : ' + str(msg[0]) + ' Message ' + msg[1]
+
+    def send_chunks(self, chunks):
+        """
+        Sends one message, that is given as chunks. This function invokes the send_chunks
+        function of that module.
+        :param chunks: An iterable of strings.
+        """
+        if self.sock is not None:
+            try:
+                send_chunks(self.sock, chunks, self.compression)
             except socket.error, msg:
                 self.sock = None
                 print 'Send failed. Error Code : ' + str(msg[0]) + ' Message ' + msg[1]
@@ -307,49 +1304,175 @@ class RPSClient:
             return recv_msg(self.sock)
         return None
 
+    def receive_chunks(self):
+        """
+        Receives the next message chunk by chunk. This function invokes the recv_chunks function
+        of that module.
+        :return: A generator of strings. It is empty, if the socket of self is None.
+        """
+        if self.sock is not None:
+            return recv_chunks(self.sock)
+        return iter([])
+
 
-def prepare(p1, p2):
+def run_step(step):
     """
-    First protocol step. Exchanges the player names.
-    :param p1: Socket of player 1.
-    :param p2: Socket of player 2.
-    :return:
+    Runs a protocol step with blocking sockets.
+    :param step: A generator, that yields OP_ operations.
+    :return: The result of the step.
+    """
+    value = None
+    while True:
+        try:
+            op = step.send(value)
+        except StopIteration:
+            return None
+
+        if isinstance(op, types.GeneratorType):
+            value = run_step(op)
+        elif op[0] == OP_RESULT:
+            step.close()
+            return op[1]
+        else:
+            value = execute(op)
+
+
+def execute(op):
+    """
+    Executes an operation of a protocol step with blocking sockets.
+    :param op: An OP_RECV, OP_RECV_ANY, OP_SEND, OP_SEND_FRAMES or OP_RELAY tuple.
+    :return: The answer to the operation.
+    """
+    if op[0] == OP_RECV:
+        return recv_msg(op[1])
+    elif op[0] == OP_RECV_ANY:
+        return recv_any(op[1])
+    elif op[0] == OP_SEND:
+        send_msg(op[1], op[2])
+    elif op[0] == OP_RELAY:
+        return relay_msg(*op[1:])
+    elif op[0] == OP_SEND_FRAMES:
+        for flags, payload in op[2]:
+            send_frame(op[1], flags, payload)
+    else:
+        raise ValueError('Unknown protocol operation ' + str(op[0]))
+
+
+def hello(sock):
+    """
+    Step, that receives the name and the features of a player, before it joins the lobby.
+    :param sock: Socket of the player.
+    :return: A LobbyPlayer object or None, if the connection is closed.
+    """
+    name = yield OP_RECV, sock
+    features = yield OP_RECV, sock
+    if name is None or features is None:
+        yield OP_RESULT, None
+        return
+    yield OP_RESULT, LobbyPlayer(sock, name, parse_features(features))
+
+
+def prepare(p1, p2, cache=None):
+    """
+    First protocol step. Exchanges the player names and agrees on the features, that both players support.
+    FEATURE_GRAPH_CACHE is only agreed, if the server has a cache and can decompress the agreed compression.
+    :param p1: LobbyPlayer object of player 1.
+    :param p2: LobbyPlayer object of player 2.
+    :param cache: The GraphCache of the server or None.
+    :return: The agreed features.
     """
-    n1 = recv_msg(p1)
-    n2 = recv_msg(p2)
+    out('The name of player 1 is ' + p1.name)
+    out('The name of player 2 is ' + p2.name)
 
-    out('The name of player 1 is ' + n1)
-    out('The name of player 2 is ' + n2)
+    features = [f for f in KNOWN_FEATURES if f in p1.features and f in p2.features]
+    if FEATURE_GRAPH_CACHE in features and (cache is None or
+                                            FEATURE_LZ4 in features and FEATURE_LZ4 not in local_features()):
+        features.remove(FEATURE_GRAPH_CACHE)
+    out('Agreed features: ' + ' '.join(features))
 
-    send_msg(p1, n2)
-    send_msg(p2, n1)
+    yield OP_SEND, p1.sock, p2.name
+    yield OP_SEND, p2.sock, p1.name
+    yield OP_SEND, p1.sock, features_msg(features)
+    yield OP_SEND, p2.sock, features_msg(features)
 
-    return False
+    yield OP_RESULT, features
 
 
-def share_graphs(p1, p2):
+def share_graphs(p1, p2, features=(), cache=None):
     """
     Second protocol step. Initializes the graphs and sends them to both players.
     :param p1: Socket of player 1.
     :param p2: Socket of player 2.
+    :param features: The features agreed on in the first step.
+    :param cache: The GraphCache of the server or None.
     :return:
     """
 
     # Send a message to player 1, so that this player creates the graphs and send
     # them to this server.
-    send_msg(p1, GRAPHS_NEED)
+    yield OP_SEND, p1, GRAPHS_NEED
+
+    if FEATURE_GRAPH_CACHE in features and FEATURE_BATCH in features:
+        yield share_cached_graphs(p1, p2, cache, features)
+        yield OP_RESULT, False
+        return
+
+    if FEATURE_BATCH in features:
+        # Player 1 sends all graphs in one batch message, that is forwarded as it is.
+        yield OP_RELAY, p1, p2
+        yield OP_RESULT, False
+        return
+
+    # The graphs are forwarded chunk by chunk as they arrive, compressed graphs stay compressed.
+    yield OP_SEND, p2, GRAPHS_SEND_START
+    yield OP_RELAY, p1, p2
+    yield OP_RELAY, p1, p2
+    yield OP_RELAY, p1, p2
+    yield OP_SEND, p2, GRAPHS_SEND_END
+
+    yield OP_RESULT, False
 
-    e1 = recv_msg(p1)
-    e2 = recv_msg(p1)
-    e3 = recv_msg(p1)
 
-    send_msg(p2, GRAPHS_SEND_START)
-    send_msg(p2, e1)
-    send_msg(p2, e2)
-    send_msg(p2, e3)
-    send_msg(p2, GRAPHS_SEND_END)
+def share_cached_graphs(p1, p2, cache, features):
+    """
+    Shares the graphs by reference, if possible. Player 1 offers the hash of a triple, that it holds,
+    or requests fresh graphs. An offered triple is neither generated nor sent again, if player 2 holds it
+    as well or if it is in the cache of the server. Otherwise the triple is relayed like in share_graphs
+    and its frames are added to the cache.
+    :param p1: Socket of player 1, that has received GRAPHS_NEED.
+    :param p2: Socket of player 2.
+    :param cache: The GraphCache of the server.
+    :param features: The features agreed on in the first step.
+    """
+    offer = yield OP_RECV, p1
+    if offer is None or not offer.startswith(GRAPHS_OFFER):
+        return
+    h = offer[len(GRAPHS_OFFER) + 1:]
+
+    if h:
+        yield OP_SEND, p2, GRAPHS_REUSE + ' ' + h
+        answer = yield OP_RECV, p2
+        if answer == GRAPHS_HAVE:
+            out('Both players hold the graphs ' + h)
+            yield OP_SEND, p1, GRAPHS_HAVE
+            return
+
+        frames = cache.get(h)
+        if frames is not None:
+            out('The graphs ' + h + ' are sent from the cache')
+            yield OP_SEND, p1, GRAPHS_HAVE
+            if frames_supported(frames, features):
+                yield OP_SEND_FRAMES, p2, frames
+            else:
+                # The triple was cached in a game with another compression.
+                yield OP_SEND, p2, join_frames(frames)
+            return
 
-    return False
+    # Player 1 sends the offered triple or fresh graphs, they are relayed chunk by chunk.
+    yield OP_SEND, p1, GRAPHS_NEED
+    frames = []
+    if (yield OP_RELAY, p1, p2, frames):
+        cache.put(frames)
 
 
 def turn(p1, p2):
@@ -359,41 +1482,56 @@ def turn(p1, p2):
     :param p2: Socket of player 2.
     :return: Whether the game is over or not.
     """
-    send_msg(p1, TURN_NEED)
-    send_msg(p2, TURN_SEND)
-    t1 = recv_msg(p1)
-    send_msg(p2, t1)
-    t2 = recv_msg(p2)
-    send_msg(p1, t2)
-    t3 = recv_msg(p1)
-    send_msg(p2, t3)
+    yield OP_SEND, p1, TURN_NEED
+    yield OP_SEND, p2, TURN_SEND
+    yield OP_RELAY, p1, p2
+    yield OP_RELAY, p2, p1
+    yield OP_RELAY, p1, p2
 
-    res_p1 = int(recv_msg(p1))
-    res_p2 = int(recv_msg(p2))
+    # The results are received in the order they arrive.
+    results = yield recv_each(p1, p2)
+    res_p1 = int(results[p1])
+    res_p2 = int(results[p2])
 
     if res_p1 == res_p2:
         # If the results aren't equals, the game will be interrupted
 
         if res_p1 == -1:
-            return False
+            yield OP_RESULT, False
+            return
 
-    return True
+    yield OP_RESULT, True
 
 
 def play_again(p1, p2):
     """
-    Fourth protocol step. This function handles a regame.
+    Fourth protocol step. This function handles a regame. Each answer is forwarded to the other player,
+    as soon as it arrives. A closed connection is forwarded as PLAY_AGAIN_FALSE.
     :param p1: Socket of player 1.
     :param p2: Socket of player 2.
-    :return: Whether both players wants to play again or not.
+    :return: A tuple with the answers of both players, whether they want to play again or not.
     """
-    p1_again = recv_msg(p1)
-    p2_again = recv_msg(p2)
+    answers = {}
+    while len(answers) < 2:
+        sock, answer = yield OP_RECV_ANY, [s for s in (p1, p2) if s not in answers]
+        answers[sock] = answer
+        yield OP_SEND, p2 if sock is p1 else p1, answer if answer is not None else PLAY_AGAIN_FALSE
 
-    send_msg(p1, p2_again)
-    send_msg(p2, p1_again)
+    yield OP_RESULT, (answers[p1] == PLAY_AGAIN_TRUE, answers[p2] == PLAY_AGAIN_TRUE)
 
-    return p1_again == PLAY_AGAIN_TRUE and p2_again == PLAY_AGAIN_TRUE
+
+def recv_each(p1, p2):
+    """
+    Step, that receives one message of each player in the order they arrive.
+    :param p1: Socket of player 1.
+    :param p2: Socket of player 2.
+    :return: A dict, that maps each socket to its message or None, if the connection is closed.
+    """
+    messages = {}
+    while len(messages) < 2:
+        sock, msg = yield OP_RECV_ANY, [s for s in (p1, p2) if s not in messages]
+        messages[sock] = msg
+    yield OP_RESULT, messages
 
 
 class RPSProtocol:
@@ -401,42 +1539,64 @@ class RPSProtocol:
     This class represents a protocol to organize the network requests
     between clients and server.
     """
-    def __init__(self):
+    def __init__(self, p1, p2, cache=None):
         """
         Creates a new RPSProtocol object.
+        :param p1: LobbyPlayer object of player 1.
+        :param p2: LobbyPlayer object of player 2.
+        :param cache: The GraphCache of the server or None.
         """
         self.index = 0
+        self.players = (p1, p2)
+        self.features = []
+        self.cache = cache
+
+        # The players, that want to play again, when the opponent does not.
+        self.rejoin = []
 
     def next_step(self, p1, p2):
         """
-        Proceeds the next protocol step and returns the result.
+        Proceeds the next protocol step with blocking sockets and returns the result.
         :param p1: Socket of player 1.
         :param p2: Socket of player 2.
-        :return:
+        :return: Whether the game is over or not.
+        """
+        return run_step(self.step(p1, p2))
+
+    def step(self, p1, p2):
+        """
+        Proceeds the next protocol step. This generator yields the OP_ operations of the step.
+        :param p1: Socket of player 1.
+        :param p2: Socket of player 2.
+        :return: Whether the game is over or not.
         """
 
         self.index += 1
         out('Protocol step' + str(self.index))
 
         if self.index == 1:
-            return prepare(p1, p2)
+            self.features = yield prepare(self.players[0], self.players[1], self.cache)
+            yield OP_RESULT, False
 
         elif self.index == 2:
-            return share_graphs(p1, p2)
+            yield OP_RESULT, (yield share_graphs(p1, p2, self.features, self.cache))
 
         elif self.index == 3:
-            if turn(p1, p2):
+            if (yield turn(p1, p2)):
                 # The game is over
 
-                return False
+                yield OP_RESULT, False
             else:
                 # It's a draw. The game needs a new turn
                 self.index -= 1
-                return False
+                yield OP_RESULT, False
 
         elif self.index == 4:
-            if play_again(p1, p2):
+            again = yield play_again(p1, p2)
+            if again[0] and again[1]:
                 self.index = 2
-                return False
+                yield OP_RESULT, False
             else:
-                return True
+                # A player, that wants to play again, gets a new opponent from the lobby.
+                self.rejoin = [player for player, a in zip(self.players, again) if a]
+                yield OP_RESULT, True
@@ -0,0 +1,170 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import socket, multiprocessing, time, sys, signal, argparse
+import RPSNetwork, RPSEventServer
+
+#
+# The time in seconds between two checks of the worker processes.
+#
+CHECK_INTERVAL = 0.5
+
+#
+# The minimal time in seconds between two starts of the same worker, so a worker, that crashes
+# at once, is not restarted in a busy loop.
+#
+RESTART_DELAY = 1.0
+
+
+def run_worker(tcp_port, udp_port, max_games, handoff, receivers):
+    """
+    Runs the RPSEventServer of a worker process.
+    :param tcp_port: The port to listen with the tcp socket.
+    :param udp_port: The port to listen with the udp socket or None.
+    :param max_games: The maximal number of running games of this worker or 0 for no limit.
+    :param handoff: The socket to hand off waiting players or None.
+    :param receivers: The sockets to receive handed off players.
+    """
+    server = RPSEventServer.RPSEventServer(max_games, reuse_port=True)
+    server.handoff = handoff
+    server.receivers = receivers
+    server.start(tcp_port, udp_port)
+
+
+class Supervisor:
+    """
+    This class starts several worker processes, that listen on the same tcp port with SO_REUSEPORT.
+    The kernel distributes the connections among the workers and each worker runs its own event loop.
+    Only worker 0 answers discovery requests. The other workers hand off players, that wait alone in
+    their lobby, to worker 0, so two players on different workers still find each other.
+    """
+    def __init__(self, workers, tcp_port, udp_port, max_games=0):
+        """
+        Creates a new Supervisor object.
+        :param workers: The number of worker processes or 0 for one worker per cpu.
+        :param tcp_port: The port to listen with the tcp sockets.
+        :param udp_port: The port to listen with the udp socket.
+        :param max_games: The maximal number of running games per worker or 0 for no limit.
+        """
+        if workers <= 0:
+            workers = multiprocessing.cpu_count()
+        if workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+            print 'SO_REUSEPORT is not supported, only one worker is started'
+            workers = 1
+
+        self.running = False
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.max_games = max_games
+
+        # The process and the last start time of each worker.
+        self.processes = [None] * workers
+        self.started = [0.0] * workers
+
+        # A pair of unix datagram sockets for each worker except worker 0. Worker i sends its waiting
+        # players with handoffs[i][0] and worker 0 receives them with handoffs[i][1].
+        self.handoffs = [None]
+        for i in range(1, workers):
+            pair = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+            pair[1].setblocking(0)
+            self.handoffs.append(pair)
+
+    def start(self):
+        """
+        Starts all workers and restarts workers, that crash, until the supervisor is stopped or all workers
+        have exited normally.
+        """
+        self.running = True
+        for i in range(0, len(self.processes)):
+            self.start_worker(i)
+
+        try:
+            while self.running and any(p is not None for p in self.processes):
+                time.sleep(CHECK_INTERVAL)
+                for i, p in enumerate(self.processes):
+                    if p is None or p.is_alive():
+                        continue
+
+                    p.join()
+                    if p.exitcode == 0:
+                        # The worker has exited normally, e.g. because the port is in use.
+                        print 'Worker ' + str(i) + ' has exited'
+                        self.processes[i] = None
+                    elif time.time() - self.started[i] >= RESTART_DELAY:
+                        print 'Worker ' + str(i) + ' has crashed with exit code ' + str(p.exitcode)
+                        self.start_worker(i)
+        finally:
+            self.stop()
+
+    def start_worker(self, i):
+        """
+        Starts the worker process with the given index.
+        :param i: The index of the worker.
+        """
+        udp_port = None
+        handoff = None
+        receivers = []
+        if i == 0:
+            udp_port = self.udp_port
+            receivers = [pair[1] for pair in self.handoffs[1:]]
+        else:
+            handoff = self.handoffs[i][0]
+
+        p = multiprocessing.Process(target=run_worker,
+                                    args=(self.tcp_port, udp_port, self.max_games, handoff, receivers))
+        p.daemon = True
+        p.start()
+        self.processes[i] = p
+        self.started[i] = time.time()
+        RPSNetwork.out('Worker ' + str(i) + ' started with pid ' + str(p.pid))
+
+    def stop(self):
+        """
+        Stops the supervisor and terminates all workers.
+        """
+        self.running = False
+        for i, p in enumerate(self.processes):
+            if p is not None:
+                p.terminate()
+                p.join()
+                self.processes[i] = None
+
+
+def main(argv):
+    """
+    Command line tool to run the server in several worker processes.
+    :param argv: The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Runs the RPS server in several worker processes.')
+    parser.add_argument('--tcp-port', type=int, default=54321, help='the tcp port of the server')
+    parser.add_argument('--udp-port', type=int, default=54321, help='the udp port of the server')
+    parser.add_argument('--workers', type=int, default=0, help='the number of worker processes, 0 for one per cpu')
+    parser.add_argument('--max-games', type=int, default=0,
+                        help='the maximal number of running games per worker, 0 for no limit')
+    args = parser.parse_args(argv)
+
+    # The workers are terminated, when the supervisor is terminated.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    supervisor = Supervisor(args.workers, args.tcp_port, args.udp_port, args.max_games)
+    try:
+        supervisor.start()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
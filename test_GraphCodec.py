@@ -0,0 +1,255 @@
+"""
+Copyright (c) 2016 Cyrill Jauner
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import unittest, hashlib
+import GraphCodec, Graphs
+
+
+class VarintTest(unittest.TestCase):
+    """
+    Tests the varint functions at the boundaries of each width.
+    """
+    BOUNDARIES = [0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, 2 ** 32 - 1, 2 ** 32, 2 ** 64 - 1]
+
+    def test_round_trip(self):
+        for n in self.BOUNDARIES:
+            buf = bytearray()
+            GraphCodec.encode_varint(buf, n)
+            self.assertEqual(GraphCodec.decode_varint(buf, 0), (n, len(buf)))
+            self.assertEqual(GraphCodec.read_varint(buf, 0), (n, len(buf)))
+
+    def test_width(self):
+        for n, width in [(0x7F, 1), (0x80, 2), (0x3FFF, 2), (0x4000, 3), (2 ** 64 - 1, 10)]:
+            buf = bytearray()
+            GraphCodec.encode_varint(buf, n)
+            self.assertEqual(len(buf), width)
+
+    def test_truncated(self):
+        self.assertRaises(ValueError, GraphCodec.decode_varint, bytearray('\x80\x80'), 0)
+        self.assertIsNone(GraphCodec.read_varint(bytearray('\x80\x80'), 0))
+
+    def test_too_long(self):
+        data = bytearray('\xff' * GraphCodec.MAX_VARINT_BYTES + '\x01')
+        self.assertRaises(ValueError, GraphCodec.decode_varint, data, 0)
+        self.assertRaises(ValueError, GraphCodec.read_varint, data, 0)
+
+
+class HeaderTest(unittest.TestCase):
+    """
+    Tests the checks of the payload header.
+    """
+    def test_no_payload(self):
+        self.assertIsNone(GraphCodec.payload_type(''))
+        self.assertIsNone(GraphCodec.payload_type('NEED_GRAPHS'))
+
+    def test_bad_version(self):
+        data = GraphCodec.encode_edges([(1, 2)])
+        bad = data[0] + chr(GraphCodec.VERSION + 1) + data[2:]
+        self.assertRaises(ValueError, GraphCodec.payload_type, bad)
+        self.assertRaises(ValueError, GraphCodec.decode_edges, bad)
+
+    def test_bad_type(self):
+        edges = GraphCodec.encode_edges([(1, 2)])
+        permutation = GraphCodec.encode_permutation([1, 0])
+        self.assertRaises(ValueError, GraphCodec.decode_edges, permutation)
+        self.assertRaises(ValueError, GraphCodec.decode_permutation, edges)
+        self.assertRaises(ValueError, GraphCodec.decode_seed, edges)
+        self.assertRaises(ValueError, GraphCodec.BatchReader, edges)
+        self.assertRaises(ValueError, GraphCodec.decode, edges[:2] + chr(99) + edges[3:])
+
+
+class EdgesTest(unittest.TestCase):
+    """
+    Tests the encoding and decoding of edge lists.
+    """
+    EDGES = [(1, 2), (1, 5), (2, 3), (3, 200), (150, 100000), (4, 2 ** 32 - 1)]
+
+    def expected(self, edges):
+        return sorted((u, v) if u <= v else (v, u) for (u, v) in edges)
+
+    def test_empty(self):
+        self.assertEqual(GraphCodec.decode_edges(GraphCodec.encode_edges([])), [])
+
+    def test_round_trip(self):
+        data = GraphCodec.encode_edges(self.EDGES)
+        self.assertEqual(GraphCodec.decode_edges(data), self.expected(self.EDGES))
+        self.assertEqual(GraphCodec.decode(data), self.expected(self.EDGES))
+
+    def test_unsorted(self):
+        edges = [(5, 1), (3, 2), (2, 1), (4, 3)]
+        self.assertEqual(GraphCodec.decode_edges(GraphCodec.encode_edges(edges)), self.expected(edges))
+
+    def test_duplicate(self):
+        self.assertRaises(ValueError, GraphCodec.decode_edges, GraphCodec.encode_edges([(1, 2), (2, 1)]))
+
+    def test_loop(self):
+        self.assertRaises(ValueError, GraphCodec.decode_edges, GraphCodec.encode_edges([(1, 2), (3, 3)]))
+
+    def test_truncated(self):
+        data = GraphCodec.encode_edges(self.EDGES)
+        for end in range(0, len(data)):
+            self.assertRaises(ValueError, GraphCodec.decode_edges, data[:end])
+
+    def test_trailing_data(self):
+        data = GraphCodec.encode_edges(self.EDGES)
+        self.assertRaises(ValueError, GraphCodec.decode_edges, data + '\x01\x01')
+
+    def test_count_too_high(self):
+        data = str(GraphCodec.header(GraphCodec.TYPE_EDGES)) + '\x05\x01\x01'
+        self.assertRaises(ValueError, GraphCodec.decode_edges, data)
+
+    def test_long_varint(self):
+        data = str(GraphCodec.header(GraphCodec.TYPE_EDGES)) + '\x01' + '\xff' * 20 + '\x01\x01'
+        self.assertRaises(ValueError, GraphCodec.decode_edges, data)
+
+    def test_chunks(self):
+        edges = [(u, u + d) for u in range(1, 2000) for d in (1, 7)]
+        chunks = list(GraphCodec.iter_encode_edges(edges, chunk_size=64))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(GraphCodec.decode_edges(''.join(chunks)), self.expected(edges))
+
+    def test_decoder_byte_by_byte(self):
+        data = GraphCodec.encode_edges(self.EDGES)
+        decoder = GraphCodec.EdgeDecoder()
+        for c in data:
+            decoder.feed(c)
+        self.assertEqual(decoder.finish(), self.expected(self.EDGES))
+
+    def test_decoder_truncated(self):
+        decoder = GraphCodec.EdgeDecoder()
+        decoder.feed(GraphCodec.encode_edges(self.EDGES)[:-1])
+        self.assertRaises(ValueError, decoder.finish)
+
+    def test_decoder_empty(self):
+        self.assertRaises(ValueError, GraphCodec.EdgeDecoder().finish)
+
+
+class PermutationTest(unittest.TestCase):
+    """
+    Tests the encoding and decoding of isomorphism lists.
+    """
+    def test_empty(self):
+        self.assertEqual(GraphCodec.decode_permutation(GraphCodec.encode_permutation([])), [])
+
+    def test_widths(self):
+        for n, width in [(1, 1), (0x100, 1), (0x101, 2), (0x10000, 2), (0x10001, 4)]:
+            L = range(n - 1, -1, -1)
+            data = GraphCodec.encode_permutation(L)
+            self.assertEqual(ord(data[-n * width - 1]), width)
+            self.assertEqual(GraphCodec.decode_permutation(data), L)
+
+    def test_out_of_range(self):
+        data = GraphCodec.encode_permutation([0, 1, 2])
+        self.assertRaises(ValueError, GraphCodec.decode_permutation, data[:-1] + '\x03')
+
+    def test_duplicate(self):
+        data = GraphCodec.encode_permutation([0, 1, 2])
+        self.assertRaises(ValueError, GraphCodec.decode_permutation, data[:-1] + '\x01')
+
+    def test_truncated(self):
+        data = GraphCodec.encode_permutation(range(0, 300))
+        for end in range(0, len(data)):
+            self.assertRaises(ValueError, GraphCodec.decode_permutation, data[:end])
+
+    def test_too_long(self):
+        data = GraphCodec.encode_permutation([0, 1, 2])
+        self.assertRaises(ValueError, GraphCodec.decode_permutation, data + '\x03')
+
+    def test_apply(self):
+        L = GraphCodec.decode_permutation(GraphCodec.encode_permutation([2, 0, 1]))
+        for G in ([(1, 2), (2, 3)], Graphs.Graph([(1, 2), (2, 3)]), Graphs.CompactGraph([(1, 2), (2, 3)])):
+            self.assertEqual(sorted(Graphs.apply_permutation(G, L)), [(1, 2), (3, 1)])
+            self.assertEqual(sorted(Graphs.apply_inverse_permutation(Graphs.apply_permutation(G, L), L)),
+                             [(1, 2), (2, 3)])
+
+    def test_apply_out_of_range(self):
+        numpy = Graphs.numpy
+        try:
+            for Graphs.numpy in set([numpy, None]):
+                for edges in ([(0, 1), (1, 2)], [(1, 2), (2, 4)]):
+                    for G in (edges, Graphs.Graph(edges), Graphs.CompactGraph(edges)):
+                        self.assertRaises(ValueError, Graphs.apply_permutation, G, [2, 0, 1])
+                        self.assertRaises(ValueError, Graphs.apply_inverse_permutation, G, [2, 0, 1])
+        finally:
+            Graphs.numpy = numpy
+
+    def test_bad_width(self):
+        data = GraphCodec.encode_permutation([0, 1])
+        self.assertRaises(ValueError, GraphCodec.decode_permutation, data[:4] + '\x03' + data[5:])
+
+
+class BatchTest(unittest.TestCase):
+    """
+    Tests the batch encoding and BatchReader.
+    """
+    def test_round_trip(self):
+        graphs = [[(1, 2), (2, 3)], [], [(1, 3)]]
+        reader = GraphCodec.BatchReader(GraphCodec.encode_batch([GraphCodec.encode_edges(g) for g in graphs]))
+        self.assertEqual(len(reader), 3)
+        self.assertEqual(reader.all_edges(), graphs)
+        self.assertEqual(reader.edges(2), graphs[2])
+
+    def test_empty(self):
+        self.assertEqual(len(GraphCodec.BatchReader(GraphCodec.encode_batch([]))), 0)
+
+    def test_truncated(self):
+        data = GraphCodec.encode_batch([GraphCodec.encode_edges([(1, 2)])] * 2)
+        for end in range(0, len(data)):
+            self.assertRaises(ValueError, GraphCodec.BatchReader, data[:end])
+
+    def test_too_long(self):
+        data = GraphCodec.encode_batch([GraphCodec.encode_edges([(1, 2)])])
+        self.assertRaises(ValueError, GraphCodec.BatchReader, data + '\x00')
+
+    def test_bad_offsets(self):
+        data = bytearray(GraphCodec.encode_batch([GraphCodec.encode_edges([(1, 2)])] * 2))
+        # The offset of the second payload is after the end of the batch.
+        data[11] = 0xFF
+        self.assertRaises(ValueError, GraphCodec.BatchReader, str(data))
+
+    def test_huge_count(self):
+        data = str(GraphCodec.header(GraphCodec.TYPE_BATCH)) + '\xff\xff\xff\xff'
+        self.assertRaises(ValueError, GraphCodec.BatchReader, data)
+
+
+class SeedTest(unittest.TestCase):
+    """
+    Tests the encoding and decoding of seed payloads.
+    """
+    DIGEST = hashlib.sha1('graphs').hexdigest()
+
+    def test_round_trip(self):
+        for seed in [0, 1, 2 ** 63 - 1]:
+            data = GraphCodec.encode_seed(1, 'pairing', 3, 100, 2, seed, self.DIGEST)
+            self.assertEqual(GraphCodec.decode_seed(data), (1, 'pairing', 3, 100, 2, seed, self.DIGEST))
+            self.assertEqual(GraphCodec.decode(data), (1, 'pairing', 3, 100, 2, seed, self.DIGEST))
+
+    def test_truncated(self):
+        data = GraphCodec.encode_seed(1, 'matrix', 3, 100, 2, 12345, self.DIGEST)
+        for end in range(0, len(data)):
+            self.assertRaises(ValueError, GraphCodec.decode_seed, data[:end])
+
+    def test_too_long(self):
+        data = GraphCodec.encode_seed(1, 'matrix', 3, 100, 2, 12345, self.DIGEST)
+        self.assertRaises(ValueError, GraphCodec.decode_seed, data + '\x00')
+
+    def test_long_varint(self):
+        data = str(GraphCodec.header(GraphCodec.TYPE_SEED)) + '\xff' * 20 + '\x01'
+        self.assertRaises(ValueError, GraphCodec.decode_seed, data)
+
+
+if __name__ == '__main__':
+    unittest.main()